@@ -0,0 +1,29 @@
+"""create overview refresh queue table
+
+Revision ID: 5e2c8a91d4f7
+Revises: b3f1d2a7c9e4
+Create Date: 2026-10-17 11:03:27.184960
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5e2c8a91d4f7"
+down_revision = "b3f1d2a7c9e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "overview_refresh_queue",
+        sa.Column("rodne_cislo", sa.String(length=10), nullable=False),
+        sa.Column("queued_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("rodne_cislo"),
+    )
+
+
+def downgrade():
+    op.drop_table("overview_refresh_queue")
@@ -0,0 +1,108 @@
+"""create donors search index
+
+Revision ID: 8a4d6f0e2b13
+Revises: 5e2c8a91d4f7
+Create Date: 2026-10-17 13:41:55.620391
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8a4d6f0e2b13"
+down_revision = "5e2c8a91d4f7"
+branch_labels = None
+depends_on = None
+
+# Searched values of a donor from the overview, the note is appended
+OVERVIEW_CONTENT = """
+    "donors_overview"."rodne_cislo" || char(10)
+    || "donors_overview"."first_name" || char(10)
+    || "donors_overview"."last_name" || char(10)
+    || "donors_overview"."address" || char(10)
+    || "donors_overview"."city" || char(10)
+    || "donors_overview"."postal_code" || char(10)
+    || "donors_overview"."kod_pojistovny" || char(10)
+"""
+
+
+def upgrade():
+    op.create_table(
+        "donors_search",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("rodne_cislo", sa.String(length=10), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("rodne_cislo"),
+    )
+    # Trigram tokenizer makes the index usable for LIKE '%...%' queries
+    op.execute(
+        """
+        CREATE VIRTUAL TABLE "donors_search_fts" USING fts5(
+            "content",
+            content="donors_search",
+            content_rowid="id",
+            tokenize="trigram"
+        );
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO "donors_search" ("rodne_cislo", "content")
+        SELECT
+            "donors_overview"."rodne_cislo",
+            {OVERVIEW_CONTENT} || COALESCE("notes"."note", '')
+        FROM "donors_overview"
+            LEFT JOIN "notes"
+                ON "notes"."rodne_cislo" = "donors_overview"."rodne_cislo";
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO "donors_search_fts" ("donors_search_fts") VALUES ('rebuild');
+        """
+    )
+
+    # Changes of notes are propagated to the index of the affected donor.
+    # Donors removed from the overview keep their content until the next
+    # refresh of the overview removes them from the index.
+    for event, row, note in (
+        ("INSERT", "NEW", 'NEW."note"'),
+        ("UPDATE", "NEW", 'NEW."note"'),
+        ("DELETE", "OLD", "NULL"),
+    ):
+        op.execute(
+            f"""
+            CREATE TRIGGER "donors_search_after_note_{event.lower()}"
+            AFTER {event} ON "notes"
+            BEGIN
+                INSERT INTO "donors_search_fts"
+                    ("donors_search_fts", "rowid", "content")
+                SELECT 'delete', "id", "content"
+                FROM "donors_search"
+                WHERE "rodne_cislo" = {row}."rodne_cislo";
+                UPDATE "donors_search"
+                SET "content" = COALESCE(
+                    (
+                        SELECT {OVERVIEW_CONTENT} || COALESCE({note}, '')
+                        FROM "donors_overview"
+                        WHERE "donors_overview"."rodne_cislo" = {row}."rodne_cislo"
+                    ),
+                    "content"
+                )
+                WHERE "rodne_cislo" = {row}."rodne_cislo";
+                INSERT INTO "donors_search_fts" ("rowid", "content")
+                SELECT "id", "content"
+                FROM "donors_search"
+                WHERE "rodne_cislo" = {row}."rodne_cislo";
+            END;
+            """
+        )
+
+
+def downgrade():
+    for event in ("insert", "update", "delete"):
+        op.execute(f'DROP TRIGGER "donors_search_after_note_{event}";')
+    op.execute('DROP TABLE "donors_search_fts";')
+    op.drop_table("donors_search")
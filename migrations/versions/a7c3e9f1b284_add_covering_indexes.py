@@ -0,0 +1,48 @@
+"""add covering indexes for refresh of the overview
+
+Revision ID: a7c3e9f1b284
+Revises: f2b8c4d6a019
+Create Date: 2026-10-17 20:31:12.408251
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a7c3e9f1b284"
+down_revision = "f2b8c4d6a019"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Records of a donor are searched together with their batches and donation
+    # counts, the new index starts with the same column as the old one.
+    op.create_index(
+        "ix_records_rodne_cislo_batch_id",
+        "records",
+        ["rodne_cislo", "batch_id", "donation_count"],
+    )
+    op.drop_index("ix_records_rodne_cislo", table_name="records")
+    # Latest records of every donor are ranked in the same order
+    # as they are stored in the index
+    op.create_index(
+        "ix_latest_records_rodne_cislo_imported_at",
+        "latest_records",
+        [
+            "rodne_cislo",
+            sa.text('"imported_at" DESC'),
+            sa.text('"donation_count" DESC'),
+            "donation_center_id",
+            "record_id",
+        ],
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_latest_records_rodne_cislo_imported_at", table_name="latest_records"
+    )
+    op.create_index("ix_records_rodne_cislo", "records", ["rodne_cislo"])
+    op.drop_index("ix_records_rodne_cislo_batch_id", table_name="records")
@@ -0,0 +1,167 @@
+"""create latest records table
+
+Revision ID: b3f1d2a7c9e4
+Revises: 72e643ad5b8c
+Create Date: 2026-10-17 09:12:41.503218
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b3f1d2a7c9e4"
+down_revision = "72e643ad5b8c"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "latest_records",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("rodne_cislo", sa.String(length=10), nullable=False),
+        sa.Column("donation_center_id", sa.Integer(), nullable=True),
+        sa.Column("record_id", sa.Integer(), nullable=False),
+        sa.Column("imported_at", sa.DateTime(), nullable=False),
+        sa.Column("donation_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["donation_center_id"],
+            ["donation_centers.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["record_id"],
+            ["records.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    # Manual imports have NULL donation center and NULLs are distinct
+    # in unique indexes so they are replaced by zero.
+    op.create_index(
+        "ix_latest_records_rodne_cislo_donation_center_id",
+        "latest_records",
+        ["rodne_cislo", sa.text("ifnull(donation_center_id, 0)")],
+        unique=True,
+    )
+
+    # A new record replaces the latest one for the same donor and donation
+    # center if it is newer or, when imported at the same time, higher.
+    op.execute(
+        """
+        CREATE TRIGGER "latest_records_after_insert"
+        AFTER INSERT ON "records"
+        BEGIN
+            INSERT INTO "latest_records" (
+                "rodne_cislo",
+                "donation_center_id",
+                "record_id",
+                "imported_at",
+                "donation_count"
+            )
+            SELECT
+                NEW."rodne_cislo",
+                "batches"."donation_center_id",
+                NEW."id",
+                "batches"."imported_at",
+                NEW."donation_count"
+            FROM "batches"
+            WHERE "batches"."id" = NEW."batch_id"
+            ON CONFLICT ("rodne_cislo", ifnull("donation_center_id", 0))
+            DO UPDATE SET
+                "record_id" = "excluded"."record_id",
+                "imported_at" = "excluded"."imported_at",
+                "donation_count" = "excluded"."donation_count"
+            WHERE "excluded"."imported_at" > "latest_records"."imported_at"
+                OR (
+                    "excluded"."imported_at" = "latest_records"."imported_at"
+                    AND "excluded"."donation_count" > "latest_records"."donation_count"
+                );
+        END;
+        """
+    )
+    # When the latest record is deleted, the next most recent record for
+    # the same key takes its place. If there is none, the row is removed.
+    op.execute(
+        """
+        CREATE TRIGGER "latest_records_before_delete"
+        BEFORE DELETE ON "records"
+        BEGIN
+            DELETE FROM "latest_records"
+            WHERE "latest_records"."record_id" = OLD."id"
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM "records"
+                        JOIN "batches"
+                            ON "batches"."id" = "records"."batch_id"
+                    WHERE "records"."rodne_cislo" = "latest_records"."rodne_cislo"
+                        AND "batches"."donation_center_id"
+                            IS "latest_records"."donation_center_id"
+                        AND "records"."id" != OLD."id"
+                );
+            UPDATE "latest_records"
+            SET ("record_id", "imported_at", "donation_count") = (
+                SELECT
+                    "records"."id",
+                    "batches"."imported_at",
+                    "records"."donation_count"
+                FROM "records"
+                    JOIN "batches"
+                        ON "batches"."id" = "records"."batch_id"
+                WHERE "records"."rodne_cislo" = "latest_records"."rodne_cislo"
+                    AND "batches"."donation_center_id"
+                        IS "latest_records"."donation_center_id"
+                    AND "records"."id" != OLD."id"
+                ORDER BY "batches"."imported_at" DESC,
+                    "records"."donation_count" DESC
+                LIMIT 1
+            )
+            WHERE "latest_records"."record_id" = OLD."id";
+        END;
+        """
+    )
+
+    op.execute(
+        """
+        INSERT INTO "latest_records" (
+            "rodne_cislo",
+            "donation_center_id",
+            "record_id",
+            "imported_at",
+            "donation_count"
+        )
+        SELECT
+            "rodne_cislo",
+            "donation_center_id",
+            "id",
+            "imported_at",
+            "donation_count"
+        FROM (
+            SELECT
+                "records"."rodne_cislo",
+                "batches"."donation_center_id",
+                "records"."id",
+                "batches"."imported_at",
+                "records"."donation_count",
+                ROW_NUMBER() OVER (
+                    PARTITION BY "records"."rodne_cislo",
+                        "batches"."donation_center_id"
+                    ORDER BY "batches"."imported_at" DESC,
+                        "records"."donation_count" DESC
+                ) AS "center_rank"
+            FROM "records"
+                JOIN "batches"
+                    ON "batches"."id" = "records"."batch_id"
+        )
+        WHERE "center_rank" = 1;
+        """
+    )
+
+
+def downgrade():
+    op.execute('DROP TRIGGER "latest_records_before_delete";')
+    op.execute('DROP TRIGGER "latest_records_after_insert";')
+    op.drop_index(
+        "ix_latest_records_rodne_cislo_donation_center_id",
+        table_name="latest_records",
+    )
+    op.drop_table("latest_records")
@@ -0,0 +1,30 @@
+"""drop index on rodne_cislo of awarded medals covered by the primary key
+
+Revision ID: b5d2f8a4c613
+Revises: a7c3e9f1b284
+Create Date: 2026-10-17 20:58:40.193572
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b5d2f8a4c613"
+down_revision = "a7c3e9f1b284"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Donors' medals are searched by the primary key which starts
+    # with the same column
+    op.drop_index("ix_awarded_medals_rodne_cislo", table_name="awarded_medals")
+
+
+def downgrade():
+    op.create_index(
+        "ix_awarded_medals_rodne_cislo",
+        "awarded_medals",
+        ["rodne_cislo"],
+        unique=False,
+    )
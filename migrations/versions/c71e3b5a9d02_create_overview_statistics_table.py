@@ -0,0 +1,35 @@
+"""create overview statistics table
+
+Revision ID: c71e3b5a9d02
+Revises: 8a4d6f0e2b13
+Create Date: 2026-10-17 15:20:08.731164
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c71e3b5a9d02"
+down_revision = "8a4d6f0e2b13"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "overview_statistics",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("donors_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute(
+        """
+        INSERT INTO "overview_statistics" ("id", "donors_count")
+        SELECT 1, count(*) FROM "donors_overview";
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("overview_statistics")
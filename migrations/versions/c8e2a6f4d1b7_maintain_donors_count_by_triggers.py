@@ -0,0 +1,53 @@
+"""maintain donors count in overview statistics by triggers
+
+Revision ID: c8e2a6f4d1b7
+Revises: b5d2f8a4c613
+Create Date: 2026-10-17 22:14:36.402817
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c8e2a6f4d1b7"
+down_revision = "b5d2f8a4c613"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Every change of the overview (a refresh or an ignored donor)
+    # keeps the count of donors up to date.
+    op.execute(
+        """
+        CREATE TRIGGER "overview_statistics_after_donor_insert"
+        AFTER INSERT ON "donors_overview"
+        BEGIN
+            UPDATE "overview_statistics"
+            SET "donors_count" = "donors_count" + 1
+            WHERE "id" = 1;
+        END;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER "overview_statistics_after_donor_delete"
+        AFTER DELETE ON "donors_overview"
+        BEGIN
+            UPDATE "overview_statistics"
+            SET "donors_count" = "donors_count" - 1
+            WHERE "id" = 1;
+        END;
+        """
+    )
+    op.execute(
+        """
+        INSERT OR REPLACE INTO "overview_statistics" ("id", "donors_count")
+        SELECT 1, count(*) FROM "donors_overview";
+        """
+    )
+
+
+def downgrade():
+    op.execute('DROP TRIGGER "overview_statistics_after_donor_delete";')
+    op.execute('DROP TRIGGER "overview_statistics_after_donor_insert";')
@@ -0,0 +1,29 @@
+"""add indexes for ordering overview
+
+Revision ID: d4a9e7c1f305
+Revises: c71e3b5a9d02
+Create Date: 2026-10-17 16:02:47.115830
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d4a9e7c1f305"
+down_revision = "c71e3b5a9d02"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_donors_overview_donation_count_total",
+        "donors_overview",
+        ["donation_count_total", "rodne_cislo"],
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_donors_overview_donation_count_total", table_name="donors_overview"
+    )
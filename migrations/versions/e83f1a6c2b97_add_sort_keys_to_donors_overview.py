@@ -0,0 +1,53 @@
+"""add sort keys to donors overview
+
+Revision ID: e83f1a6c2b97
+Revises: d4a9e7c1f305
+Create Date: 2026-10-17 17:11:36.402518
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e83f1a6c2b97"
+down_revision = "d4a9e7c1f305"
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    "first_name",
+    "last_name",
+    "address",
+    "city",
+    "postal_code",
+    "kod_pojistovny",
+)
+
+
+def upgrade():
+    for column in COLUMNS:
+        op.add_column(
+            "donors_overview", sa.Column(f"{column}_sort_key", sa.LargeBinary())
+        )
+    # czech_sort_key is registered for every connection in registry/extensions.py
+    op.execute(
+        'UPDATE "donors_overview" SET '
+        + ", ".join(
+            f'"{column}_sort_key" = czech_sort_key("{column}")' for column in COLUMNS
+        )
+    )
+    for column in COLUMNS:
+        op.create_index(
+            f"ix_donors_overview_{column}_sort_key",
+            "donors_overview",
+            [f"{column}_sort_key", "rodne_cislo"],
+        )
+
+
+def downgrade():
+    for column in COLUMNS:
+        op.drop_index(
+            f"ix_donors_overview_{column}_sort_key", table_name="donors_overview"
+        )
+        op.drop_column("donors_overview", f"{column}_sort_key")
@@ -0,0 +1,90 @@
+"""add contacts to notes
+
+Revision ID: f2b8c4d6a019
+Revises: e83f1a6c2b97
+Create Date: 2026-10-17 18:02:41.118530
+
+"""
+
+import re
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f2b8c4d6a019"
+down_revision = "e83f1a6c2b97"
+branch_labels = None
+depends_on = None
+
+notes = sa.table(
+    "notes",
+    sa.column("rodne_cislo", sa.String),
+    sa.column("note", sa.Text),
+    sa.column("emails", sa.JSON),
+    sa.column("phones", sa.JSON),
+    sa.column("other_text", sa.Text),
+)
+
+# A copy of the contact patterns and registry.contacts.split_note from the
+# time of this migration so later changes of the app don't affect it.
+EMAIL_RE = r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"
+PHONE_RE = (
+    r"(?:\+420|00420)\s?[1-9]\d{2}\s?\d{3}\s?\d{3}"
+    r"|(?<!\d)[1-9]\d{2}\s?\d{3}\s?\d{3}(?!\d)"
+)
+NOTE_CONTACTS_PATTERN = re.compile(f"(?P<email>{EMAIL_RE})|(?P<phone>{PHONE_RE})")
+
+
+def split_note(text):
+    emails, phones, other_parts = [], [], []
+    position = 0
+    for match in NOTE_CONTACTS_PATTERN.finditer(text):
+        if match.lastgroup == "email":
+            emails.append(match[0])
+        else:
+            phones.append(match[0])
+        other_parts.append(text[position : match.start()])
+        position = match.end()
+    other_parts.append(text[position:])
+    other_text = "\n".join(
+        line.strip() for line in "".join(other_parts).split("\n") if line.strip()
+    )
+    return emails, phones, other_text
+
+
+def upgrade():
+    op.add_column(
+        "notes", sa.Column("emails", sa.JSON(), nullable=False, server_default="[]")
+    )
+    op.add_column(
+        "notes", sa.Column("phones", sa.JSON(), nullable=False, server_default="[]")
+    )
+    op.add_column(
+        "notes", sa.Column("other_text", sa.Text(), nullable=False, server_default="")
+    )
+
+    connection = op.get_bind()
+    values = []
+    for rodne_cislo, note in connection.execute(
+        sa.select(notes.c.rodne_cislo, notes.c.note)
+    ):
+        emails, phones, other_text = split_note(note or "")
+        values.append(
+            {
+                "b_rodne_cislo": rodne_cislo,
+                "emails": emails,
+                "phones": phones,
+                "other_text": other_text,
+            }
+        )
+    if values:
+        connection.execute(
+            notes.update().where(notes.c.rodne_cislo == sa.bindparam("b_rodne_cislo")),
+            values,
+        )
+
+
+def downgrade():
+    for column in ("other_text", "phones", "emails"):
+        op.drop_column("notes", column)
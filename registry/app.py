@@ -9,8 +9,11 @@ from flask import Flask, flash, redirect, url_for
 from registry import batch, commands, donor, public, user
 from registry.extensions import (
     bcrypt,
+    check_icu_extension,
     csrf_protect,
     db,
+    init_czech_locale,
+    init_sqlite_pragmas,
     login_manager,
     migrate,
 )
@@ -76,7 +79,11 @@ def create_app(config_object="registry.settings"):
 def register_extensions(app):
     """Register Flask extensions."""
     bcrypt.init_app(app)
+    # Fail fast if the database cannot be used as expected
+    init_czech_locale()
+    check_icu_extension()
     db.init_app(app)
+    init_sqlite_pragmas(app)
     csrf_protect.init_app(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
@@ -102,7 +109,9 @@ def register_commands(app):
     app.cli.add_command(commands.create_user)
     app.cli.add_command(commands.install_test_data)
     app.cli.add_command(commands.refresh_overview)
+    app.cli.add_command(commands.refresh_worker)
     app.cli.add_command(commands.import_emails)
+    app.cli.add_command(commands.create_snapshots)
 
 
 def configure_logger(app):
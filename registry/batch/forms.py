@@ -1,11 +1,27 @@
+from io import TextIOWrapper
+
+from flask import current_app
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField
 from wtforms import HiddenField, SelectField, TextAreaField
 
 from registry.donor.models import Batch, DonationCenter
 from registry.extensions import db
 from registry.utils import DataRequired
 
-from .utils import validate_contact_import_data, validate_import_data
+from .utils import (
+    iter_import_data,
+    parse_contact_import_data,
+    validate_import_data,
+)
+
+
+def get_validation_options():
+    """Options for validation of imported data from the app config."""
+    return {
+        "processes": current_app.config["IMPORT_VALIDATION_PROCESSES"],
+        "chunk_size": current_app.config["IMPORT_VALIDATION_CHUNK_SIZE"],
+    }
 
 
 class ImportForm(FlaskForm):
@@ -15,6 +31,16 @@ class ImportForm(FlaskForm):
         validators=[DataRequired()],
     )
     input_data = TextAreaField("Vstupní data z odběrného místa")
+    input_file = FileField("Soubor se vstupními daty z odběrného místa")
+    encoding = SelectField(
+        "Znaková sada souboru",
+        choices=[
+            ("cp1250", "CP1250"),
+            ("utf-8", "UTF-8"),
+            ("iso-8859-2", "ISO-8859-2"),
+        ],
+        default="cp1250",
+    )
     valid_lines = TextAreaField("Bezchybná vstupní data")
     invalid_lines = TextAreaField("Vstupní data s chybami")
     invalid_lines_errors = TextAreaField("Chyby ve vstupních datech")
@@ -30,8 +56,50 @@ class ImportForm(FlaskForm):
 
     def reset_validator(self):
         self.valid_lines_content, self.invalid_lines_content = None, None
+        self.valid_lines_count = 0
         self.invalid_lines_errors.data = ""
 
+    def iter_file_lines(self):
+        """Read lines of the uploaded file from its beginning."""
+        stream = self.input_file.data.stream
+        stream.seek(0)
+        lines = TextIOWrapper(stream, encoding=self.encoding.data)
+        try:
+            yield from lines
+        finally:
+            # Keep the underlying stream open for another pass
+            lines.detach()
+
+    def iter_valid_file_lines(self):
+        for line, errors in iter_import_data(
+            self.iter_file_lines(), **get_validation_options()
+        ):
+            if errors is None:
+                yield line
+
+    def validate_file(self):
+        """Validate the uploaded file line by line.
+
+        Only invalid lines are kept in memory, valid lines are read again
+        from the file when they are imported.
+        """
+        self.invalid_lines_content = []
+        try:
+            for line, errors in iter_import_data(
+                self.iter_file_lines(), **get_validation_options()
+            ):
+                if errors is None:
+                    self.valid_lines_count += 1
+                else:
+                    self.invalid_lines_content.append((line, errors))
+        except UnicodeDecodeError:
+            self.input_file.errors.append(
+                f"Soubor nelze přečíst ve znakové sadě {self.encoding.data}"
+            )
+            return False
+        self.valid_lines_content = self.iter_valid_file_lines()
+        return True
+
     def validate(self, **kwargs):
         """Validate the form."""
         initial_validation = super(ImportForm, self).validate()
@@ -46,22 +114,29 @@ class ImportForm(FlaskForm):
             # we have to cobine valid and invalid/fixed lines and check them again
             input_data = "\n".join([self.valid_lines.data, self.invalid_lines.data])
             self.valid_lines_content, self.invalid_lines_content = validate_import_data(
-                input_data
+                input_data, **get_validation_options()
             )
+            self.valid_lines_count = len(self.valid_lines_content)
             repeated_import = True
         elif self.input_data.data:
             # First import, we have to process input data
             self.valid_lines_content, self.invalid_lines_content = validate_import_data(
-                self.input_data.data
+                self.input_data.data, **get_validation_options()
             )
+            self.valid_lines_count = len(self.valid_lines_content)
+        elif self.input_file.data:
+            # Big files are validated on the fly without the text area
+            if not self.validate_file():
+                return False
 
         if self.invalid_lines_content:
             self.valid_lines.data = "\n".join(self.valid_lines_content)
-            self.invalid_lines.data = ""
-            self.invalid_lines_errors.data = ""
-            for line, errors in self.invalid_lines_content:
-                self.invalid_lines.data += line + "\n"
-                self.invalid_lines_errors.data += ", ".join(errors) + "\n"
+            self.invalid_lines.data = "".join(
+                line + "\n" for line, _ in self.invalid_lines_content
+            )
+            self.invalid_lines_errors.data = "".join(
+                ", ".join(errors) + "\n" for _, errors in self.invalid_lines_content
+            )
             return False
 
         # Empty input would cause errors
@@ -69,11 +144,15 @@ class ImportForm(FlaskForm):
             repeated_import
             and not self.valid_lines.data
             and not self.invalid_lines.data
-        ) or (not repeated_import and not self.input_data.data):
+        ) or (
+            not repeated_import
+            and not self.input_data.data
+            and not self.input_file.data
+        ):
             self.input_data.errors.append("Chybí vstupní data")
             return False
 
-        if not self.valid_lines_content and not self.invalid_lines_content:
+        if not self.valid_lines_count and not self.invalid_lines_content:
             self.input_data.errors.append(
                 "Ze vstupních dat není po filtraci co importovat"
             )
@@ -105,6 +184,8 @@ class ContactImportForm(FlaskForm):
 
     def reset_validator(self):
         self.valid_lines_content, self.invalid_lines_content = None, None
+        # Parsed contacts of valid lines reused for the import itself
+        self.valid_contacts = []
         self.invalid_lines_errors.data = ""
 
     def validate(self, **kwargs):
@@ -121,23 +202,21 @@ class ContactImportForm(FlaskForm):
         if self.valid_lines.data or self.invalid_lines.data:
             # Repeated import with fixed errors
             input_data = "\n".join([self.valid_lines.data, self.invalid_lines.data])
-            self.valid_lines_content, self.invalid_lines_content = (
-                validate_contact_import_data(input_data)
+            self.valid_contacts, self.invalid_lines_content = parse_contact_import_data(
+                input_data, **get_validation_options()
             )
             repeated_import = True
         elif self.input_data.data:
             # First import
-            self.valid_lines_content, self.invalid_lines_content = (
-                validate_contact_import_data(self.input_data.data)
+            self.valid_contacts, self.invalid_lines_content = parse_contact_import_data(
+                self.input_data.data, **get_validation_options()
             )
+        self.valid_lines_content = [line for line, _ in self.valid_contacts]
 
         if self.invalid_lines_content:
             # Normalize valid lines to show only RC, email, and phone for easier review
-            from .utils import process_contact_import_line
-
             normalized_valid_lines = []
-            for line in self.valid_lines_content:
-                data = process_contact_import_line(line)
+            for _, data in self.valid_contacts:
                 # Reconstruct line with only the parsed data
                 parts = [data["rodne_cislo"]]
                 if data["email"]:
@@ -147,11 +226,12 @@ class ContactImportForm(FlaskForm):
                 normalized_valid_lines.append(" ".join(parts))
 
             self.valid_lines.data = "\n".join(normalized_valid_lines)
-            self.invalid_lines.data = ""
-            self.invalid_lines_errors.data = ""
-            for line, errors in self.invalid_lines_content:
-                self.invalid_lines.data += line + "\n"
-                self.invalid_lines_errors.data += ", ".join(errors) + "\n"
+            self.invalid_lines.data = "".join(
+                line + "\n" for line, _ in self.invalid_lines_content
+            )
+            self.invalid_lines_errors.data = "".join(
+                ", ".join(errors) + "\n" for _, errors in self.invalid_lines_content
+            )
             return False
 
         # Empty input validation
@@ -1,17 +1,35 @@
 import re
-
-from registry.utils import is_valid_rc
-
-
-def get_part_of_line(line, delimiter=";"):
-    try:
-        del_index = line.index(delimiter)
-        return line[:del_index], line[del_index + 1 :]
-    except ValueError:
-        return line, ""
-
-
-def is_line_valid(line):
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+
+from registry.contacts import find_contacts, normalize_phone
+
+# Fields of a line of imported data and their errors when they are missing
+IMPORT_LINE_FIELDS = (
+    ("rodne_cislo", "chybí rodné číslo"),
+    ("first_name", "chybí jméno"),
+    ("last_name", "chybí příjmení"),
+    ("address", "chybí ulice"),
+    ("city", "chybí město"),
+    ("postal_code", "chybí PSČ, nahrazeno nulami"),
+    ("kod_pojistovny", "chybí pojišťovna, nahrazena nulami"),
+    ("donation_count", "nevalidní počet odběrů"),
+)
+# Missing values which can be replaced
+IMPORT_LINE_DEFAULTS = {5: "00000", 6: "000"}
+DONATION_COUNT_SUM_RE = re.compile(r"(\d+)\+(\d+)")
+
+
+def parse_import_line(line):
+    """Validate and repair one line of imported data.
+
+    The line is split only once and all its errors are collected
+    in a single pass over its fields. Returns None when the line should
+    be skipped, otherwise a tuple (line, errors) where errors are None
+    for a valid line and a list of comments for an invalid line
+    which is repaired if possible.
+    """
     parts = line.split(";")
     if not parts[-1] or parts[-1] == "0":
         # If the last part of the line is empty we can skip the line entirely.
@@ -19,37 +37,23 @@ def is_line_valid(line):
         # The same applies for explicitly mentioned 0 donations.
         return None
 
-    if len(parts) == 8 and all(parts):
-        return True
-    else:
-        return False
-
-
-def repair_two_semicolons(line):
-    repaired_line = line
-    while ";;" in repaired_line:
-        repaired_line = repaired_line.replace(";;", ";")
-    return repaired_line
-
-
-def repair_line_part_by_part(line):
-    errors = []
+    if ";;" in line:
+        fields = [part for part in parts if part]
+        if parts[0] and len(fields) == len(IMPORT_LINE_FIELDS):
+            return ";".join(fields), ["řádek obsahoval dvojici středníků"]
 
     # In the case when the count of fields is not
     # correct, there is no reason to continue.
-    # This function would ignore the additional fields
-    # which is not the correct way to fix a line.
-    parts_count = len(line.split(";"))
-    if parts_count < 8:
-        errors.append("nedostatek polí")
-        return line, errors
-    elif parts_count > 8:
-        errors.append("nadbytek polí")
-        return line, errors
-
-    rodne_cislo, rest = get_part_of_line(line)
+    # Ignoring the additional fields is not the correct way to fix a line.
+    if len(parts) < len(IMPORT_LINE_FIELDS):
+        return line, ["nedostatek polí"]
+    elif len(parts) > len(IMPORT_LINE_FIELDS):
+        return line, ["nadbytek polí"]
+
+    errors = []
+    rodne_cislo = parts[0]
     if not rodne_cislo:
-        errors.append("chybí rodné číslo")
+        errors.append(IMPORT_LINE_FIELDS[0][1])
     elif not rodne_cislo.isnumeric():
         errors.append("rodné číslo není číselné")
     elif len(rodne_cislo) > 10:
@@ -57,164 +61,240 @@ def repair_line_part_by_part(line):
     elif len(rodne_cislo) < 9:
         errors.append("rodné číslo je příliš krátké")
 
-    first_name, rest = get_part_of_line(rest)
-    if not first_name:
-        errors.append("chybí jméno")
-
-    last_name, rest = get_part_of_line(rest)
-    if not last_name:
-        errors.append("chybí příjmení")
-
-    address, rest = get_part_of_line(rest)
-    if not address:
-        errors.append("chybí ulice")
-
-    city, rest = get_part_of_line(rest)
-    if not city:
-        errors.append("chybí město")
-
-    postal_code, rest = get_part_of_line(rest)
-    if not postal_code:
-        postal_code = "00000"
-        errors.append("chybí PSČ, nahrazeno nulami")
-
-    kod_pojistovny, rest = get_part_of_line(rest)
-    if not kod_pojistovny:
-        kod_pojistovny = "000"
-        errors.append("chybí pojišťovna, nahrazena nulami")
+    for index in range(1, 7):
+        if not parts[index]:
+            errors.append(IMPORT_LINE_FIELDS[index][1])
+            if index in IMPORT_LINE_DEFAULTS:
+                parts[index] = IMPORT_LINE_DEFAULTS[index]
 
-    donation_count, rest = get_part_of_line(rest)
+    donation_count = parts[7]
     if not donation_count.isnumeric():
-        if m := re.match(r"(^\d+)\+(\d+)$", donation_count):
+        if m := DONATION_COUNT_SUM_RE.fullmatch(donation_count):
             d1, d2 = m.groups()
             s = int(d1) + int(d2)
             errors.append(f"vstup {donation_count} sečten = {s}")
-            donation_count = str(s)
+            parts[7] = str(s)
         else:
-            errors.append("nevalidní počet odběrů")
-
-    repaired_line = ";".join(
-        [
-            rodne_cislo,
-            first_name,
-            last_name,
-            address,
-            city,
-            postal_code,
-            kod_pojistovny,
-            donation_count,
-        ]
-    )
+            errors.append(IMPORT_LINE_FIELDS[7][1])
+
+    if errors:
+        return ";".join(parts), errors
+    return line, None
+
+
+def iter_chunks(iterable, chunk_size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
 
-    return repaired_line, errors
+def iter_in_processes(function, items, processes, chunk_size):
+    """Apply a function to chunks of items in a pool of processes.
 
+    The function gets a list of items and returns a list of results.
+    Results are yielded in the order of the items and only a few chunks
+    per process are read from the input in advance. Inputs fitting
+    into one chunk are processed right away without the pool.
+    """
+    chunks = iter_chunks(items, chunk_size)
+    first_chunks = list(islice(chunks, 2))
+    if len(first_chunks) < 2:
+        for chunk in first_chunks:
+            yield from function(chunk)
+        return
+
+    with ProcessPoolExecutor(processes) as executor:
+        pending = deque()
+        for chunk in chain(first_chunks, chunks):
+            pending.append(executor.submit(function, chunk))
+            if len(pending) >= 2 * processes:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def parse_import_lines(lines):
+    results = []
+    for line in lines:
+        result = parse_import_line(line.rstrip("\r\n"))
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def iter_import_data(lines, processes=0, chunk_size=10000):
+    """Validate lines of imported data one by one.
+
+    Lines can come from any iterable, for example an uploaded file,
+    so the whole input doesn't have to be kept in memory.
+    Yields tuples (line, errors) as returned by parse_import_line().
+    With more than one process, chunks of lines are validated
+    in parallel and the results keep the order of the lines.
+    """
+    if processes > 1:
+        yield from iter_in_processes(parse_import_lines, lines, processes, chunk_size)
+        return
+
+    for line in lines:
+        result = parse_import_line(line.rstrip("\r\n"))
+        if result is not None:
+            yield result
 
-def validate_import_data(text_input):
+
+def validate_import_data(text_input, processes=0, chunk_size=10000):
     valid_lines = []  # List of valid lines (strings)
     invalid_lines = []  # List of tuples (line, list of comments)
-    for line in text_input.splitlines():
-        if is_line_valid(line) is None:
-            # None means we should skip the line because the donations count
-            # is not present at the end of the line
-            continue
-
-        if ";;" in line:
-            repaired_line = repair_two_semicolons(line)
-            if is_line_valid(repaired_line):
-                invalid_lines.append(
-                    (repaired_line, ["řádek obsahoval dvojici středníků"])
-                )
-                continue
-
-        repaired_line, errors = repair_line_part_by_part(line)
-        if errors or not is_line_valid(line):
-            invalid_lines.append((repaired_line, errors))
-        else:
+    for line, errors in iter_import_data(
+        text_input.splitlines(), processes, chunk_size
+    ):
+        if errors is None:
             valid_lines.append(line)
+        else:
+            invalid_lines.append((line, errors))
 
     return valid_lines, invalid_lines
 
 
-def parse_contact_line(line):
+def extract_contact_line(line):
     """
-    Parse a line to extract rodne cislo, email, and phone number.
+    Extract rodne cislo, email, and phone number from a line.
+    Doesn't need the database so it can run in a separate process.
     Returns: tuple (rodne_cislo, email, phone, errors)
     """
-    from registry.donor.models import DonorsOverview
-    from registry.utils import EMAIL_RE, PHONE_RE, RC_RE
-
     errors = []
     rodne_cislo = None
     email = None
     phone = None
 
+    # All values are found in one scan so RC is never taken for a phone number
+    contacts = find_contacts(line)
+
     # Extract rodne cislo (mandatory)
-    rc_matches = re.findall(RC_RE, line)
-    rc_matches = [rc for rc in rc_matches if is_valid_rc(rc)]
-    if not rc_matches:
+    if not contacts.rodna_cisla:
         errors.append("chybí rodné číslo")
-    elif len(rc_matches) > 1:
+    elif len(contacts.rodna_cisla) > 1:
         errors.append("více než jedno rodné číslo")
     else:
-        # Clean rodne cislo (remove slash and spaces)
-        rodne_cislo = rc_matches[0].replace("/", "").replace(" ", "")
-
-        # Remove RC from line to avoid ambiguity with phone numbers
-        line = line.replace(rodne_cislo, "")
-
-        # Check if donor exists
-        from registry.extensions import db
-
-        donor = db.session.get(DonorsOverview, rodne_cislo)
-        if not donor:
-            errors.append("dárce s tímto rodným číslem neexistuje")
+        # Clean rodne cislo (remove slash)
+        rodne_cislo = contacts.rodna_cisla[0].replace("/", "")
 
     # Extract email (optional)
-    email_matches = re.findall(EMAIL_RE, line)
-    if len(email_matches) == 1:
-        email = email_matches[0]
-    elif len(email_matches) > 1:
+    if len(contacts.emails) == 1:
+        email = contacts.emails[0]
+    elif len(contacts.emails) > 1:
         errors.append("více než jeden e-mail")
 
     # Extract phone (optional)
-    phone_matches = re.findall(PHONE_RE, line)
-    if len(phone_matches) == 1:
-        phone = phone_matches[0]
-        # Normalize phone number (remove spaces)
-        phone = re.sub(r"\s+", "", phone)
-    elif len(phone_matches) > 1:
+    if len(contacts.phones) == 1:
+        phone = normalize_phone(contacts.phones[0])
+    elif len(contacts.phones) > 1:
         errors.append("více než jedno telefonní číslo")
 
+    return rodne_cislo, email, phone, errors
+
+
+def extract_contact_lines(lines):
+    return [(line, extract_contact_line(line)) for line in lines]
+
+
+def check_contact_line(rodne_cislo, email, phone, errors, donor_exists):
+    """Add errors which depend on the database to an extracted line."""
+    if rodne_cislo and not donor_exists:
+        errors.insert(0, "dárce s tímto rodným číslem neexistuje")
+
     # At least one contact method must be present
     if not email and not phone and not errors:
         errors.append("chybí e-mail nebo telefon")
 
+
+def get_notes_of_donors(rodna_cisla):
+    """
+    Load existing donors with their notes by a single query.
+    Returns: dict {rodne_cislo: Note or None} with existing donors only
+    """
+    from registry.donor.models import DonorsOverview, Note
+    from registry.extensions import db
+
+    return dict(
+        db.session.execute(
+            db.select(DonorsOverview.rodne_cislo, Note)
+            .outerjoin(Note, Note.rodne_cislo == DonorsOverview.rodne_cislo)
+            .where(DonorsOverview.rodne_cislo.in_(rodna_cisla))
+        ).all()
+    )
+
+
+def parse_contact_line(line):
+    """
+    Parse a line to extract rodne cislo, email, and phone number.
+    Returns: tuple (rodne_cislo, email, phone, errors)
+    """
+    rodne_cislo, email, phone, errors = extract_contact_line(line)
+    notes_of_donors = get_notes_of_donors({rodne_cislo} if rodne_cislo else set())
+    check_contact_line(
+        rodne_cislo, email, phone, errors, rodne_cislo in notes_of_donors
+    )
+
     return rodne_cislo, email, phone, errors
 
 
-def validate_contact_import_data(text_input):
+def parse_contact_import_data(text_input, processes=0, chunk_size=10000):
+    """
+    Parse and validate contact import data.
+    Contacts are extracted first and then donors and their notes
+    for all lines of a chunk are loaded by a single query.
+    With more than one process, contacts are extracted from chunks
+    of lines in parallel.
+    Returns: (valid_contacts, invalid_lines)
+    - valid_contacts: list of tuples (line, dict with keys: rodne_cislo,
+      email, phone and note with the existing Note of the donor or None)
+    - invalid_lines: list of tuples (line, list of errors)
+    """
+    valid_contacts = []
+    invalid_lines = []
+
+    # Skip empty lines
+    lines = (line for line in text_input.splitlines() if line.strip())
+    if processes > 1:
+        extracted = iter_in_processes(
+            extract_contact_lines, lines, processes, chunk_size
+        )
+    else:
+        extracted = ((line, extract_contact_line(line)) for line in lines)
+
+    # Number of rodna cisla in one query is limited by SQLite
+    for chunk in iter_chunks(extracted, 5000):
+        rodna_cisla = {rodne_cislo for _, (rodne_cislo, *_) in chunk if rodne_cislo}
+        notes_of_donors = get_notes_of_donors(rodna_cisla)
+        for line, (rodne_cislo, email, phone, errors) in chunk:
+            check_contact_line(
+                rodne_cislo, email, phone, errors, rodne_cislo in notes_of_donors
+            )
+            if errors:
+                invalid_lines.append((line, errors))
+            else:
+                contact = {
+                    "rodne_cislo": rodne_cislo,
+                    "email": email,
+                    "phone": phone,
+                    "note": notes_of_donors[rodne_cislo],
+                }
+                valid_contacts.append((line, contact))
+
+    return valid_contacts, invalid_lines
+
+
+def validate_contact_import_data(text_input, processes=0, chunk_size=10000):
     """
     Validate contact import data.
     Returns: (valid_lines, invalid_lines)
     - valid_lines: list of strings (original lines)
     - invalid_lines: list of tuples (line, list of errors)
     """
-    valid_lines = []
-    invalid_lines = []
-
-    for line in text_input.splitlines():
-        # Skip empty lines
-        if not line.strip():
-            continue
-
-        rodne_cislo, email, phone, errors = parse_contact_line(line)
-
-        if errors:
-            invalid_lines.append((line, errors))
-        else:
-            valid_lines.append(line)
-
-    return valid_lines, invalid_lines
+    valid_contacts, invalid_lines = parse_contact_import_data(
+        text_input, processes, chunk_size
+    )
+    return [line for line, _ in valid_contacts], invalid_lines
 
 
 def process_contact_import_line(line):
@@ -222,7 +302,7 @@ def process_contact_import_line(line):
     Process a validated contact import line and return structured data.
     Returns: dict with keys: rodne_cislo, email, phone
     """
-    rodne_cislo, email, phone, errors = parse_contact_line(line)
+    rodne_cislo, email, phone, errors = extract_contact_line(line)
 
     return {"rodne_cislo": rodne_cislo, "email": email, "phone": phone}
 
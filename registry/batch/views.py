@@ -12,6 +12,7 @@ from registry.donor.models import (
     Batch,
     ContactImportLog,
     DonorsOverview,
+    LatestRecord,
     Note,
     Record,
 )
@@ -24,11 +25,7 @@ from registry.utils import (
 )
 
 from .forms import ContactImportForm, DeleteBatchForm, ImportForm
-from .utils import (
-    convert_csv_to_text,
-    convert_xlsx_to_text,
-    process_contact_import_line,
-)
+from .utils import convert_csv_to_text, convert_xlsx_to_text
 
 blueprint = Blueprint("batch", __name__, static_folder="../static")
 
@@ -48,30 +45,30 @@ def import_data(rodne_cislo=None):
         else:
             donation_center_db_id = donation_center_id
         import_form.process()
-        last_record = (
-            Record.query.join(Batch)
-            .filter(Record.rodne_cislo == rodne_cislo)
-            .filter(Batch.donation_center_id == donation_center_db_id)
-            .order_by(Batch.imported_at.desc())
+        latest_record = (
+            LatestRecord.query.filter(LatestRecord.rodne_cislo == rodne_cislo)
+            .filter(LatestRecord.donation_center_id == donation_center_db_id)
             .first()
         )
-        if last_record is not None and (
+        if latest_record is not None and (
             donation_center_db_id is None or donation_center.import_increments
         ):
             import_form.input_data.data = record_as_input_data(
-                last_record, donation_count="_POČET_", sum_with_last=True
+                latest_record.record, donation_count="_POČET_", sum_with_last=True
             )
         else:
             # No last record for the given donation center
             # take the last one and start with zero.
-            last_record = (
-                Record.query.join(Batch)
-                .filter(Record.rodne_cislo == rodne_cislo)
-                .order_by(Batch.imported_at.desc())
+            latest_record = (
+                LatestRecord.query.filter(LatestRecord.rodne_cislo == rodne_cislo)
+                .order_by(
+                    LatestRecord.imported_at.desc(),
+                    LatestRecord.donation_count.desc(),
+                )
                 .first()
             )
             import_form.input_data.data = record_as_input_data(
-                last_record, donation_count="_POČET_"
+                latest_record.record, donation_count="_POČET_"
             )
 
     return render_template("batch/import.html", form=import_form)
@@ -80,7 +77,7 @@ def import_data(rodne_cislo=None):
 @blueprint.post("/import/")
 @login_required
 def import_data_post():
-    import_form = ImportForm(request.form)
+    import_form = ImportForm()
     if import_form.validate_on_submit():
         batch = Batch(
             donation_center_id=(
@@ -91,18 +88,27 @@ def import_data_post():
             imported_at=datetime.now(),
         )
         db.session.add(batch)
-        db.session.commit()
+        db.session.flush()
+
+        rodna_cisla = set()
+
+        def records():
+            for line in import_form.valid_lines_content:
+                record = Record.values_from_list([batch.id] + line.split(";"))
+                rodna_cisla.add(record["rodne_cislo"])
+                yield record
 
-        for line in import_form.valid_lines_content:
-            record = Record.from_list([batch.id] + line.split(";"))
-            db.session.add(record)
+        imported_records = Record.insert_many(records())
         db.session.commit()
-        # After successfull import, refresh overview table
-        DonorsOverview.refresh_overview()
         flash("Import proběhl úspěšně", "success")
-        if len(import_form.valid_lines_content) == 1:
-            return redirect(url_for("donor.detail", rc=record.rodne_cislo))
+        if imported_records == 1:
+            # The detail of a new donor needs the row in the overview
+            # so a single donor is refreshed at once even in background.
+            DonorsOverview.refresh_overview(rodna_cisla=rodna_cisla)
+            return redirect(url_for("donor.detail", rc=rodna_cisla.pop()))
         else:
+            # After successfull import, refresh overview of imported donors
+            DonorsOverview.schedule_refresh(rodna_cisla=rodna_cisla)
             return redirect(url_for("donor.overview"))
     else:
         flash_errors(import_form)
@@ -125,11 +131,13 @@ def delete_batch():
     delete_batch_form = DeleteBatchForm()
     if delete_batch_form.validate_on_submit():
         records = Record.query.filter(Record.batch_id == delete_batch_form.batch.id)
+        rodna_cisla = set()
         for record in records:
+            rodna_cisla.add(record.rodne_cislo)
             db.session.delete(record)
         db.session.delete(delete_batch_form.batch)
         db.session.commit()
-        DonorsOverview.refresh_overview()
+        DonorsOverview.schedule_refresh(rodna_cisla=rodna_cisla)
         flash("Dávka smazána.", "success")
     else:
         flash("Při odebrání dávky došlo k chybě.", "danger")
@@ -299,8 +307,10 @@ def import_contacts_post():
             "phones_skipped": 0,
         }
 
-        for line in contact_form.valid_lines_content:
-            data = process_contact_import_line(line)
+        # Notes were loaded together with the validation of donors,
+        # notes created here are kept for donors with more lines
+        notes = {}
+        for _, data in contact_form.valid_contacts:
             rodne_cislo = data["rodne_cislo"]
             email = data["email"]
             phone = data["phone"]
@@ -308,7 +318,7 @@ def import_contacts_post():
             stats["total"] += 1
 
             # Get or create note
-            note = db.session.get(Note, rodne_cislo)
+            note = notes.get(rodne_cislo, data["note"])
             note_is_new = False
             note_updated = False
 
@@ -316,6 +326,7 @@ def import_contacts_post():
                 note = Note(rodne_cislo=rodne_cislo, note="")
                 note_is_new = True
                 stats["new_notes"] += 1
+            notes[rodne_cislo] = note
 
             # Check and add email
             if email:
@@ -1,17 +1,24 @@
 """Commands for CLI"""
 
 import csv
-import re
+import time
 from collections import Counter
+from datetime import datetime
 
 import click
 from flask import current_app
 from flask.cli import with_appcontext
 
-from registry.donor.models import DonorsOverview, Note
+from registry.contacts import EMAIL_PATTERN
+from registry.donor.models import (
+    AwardEligibilitySnapshot,
+    DonorsOverview,
+    Note,
+    OverviewRefreshQueue,
+)
 from registry.extensions import db
+from registry.list.models import Medals
 from registry.user.models import User
-from registry.utils import EMAIL_RE
 from tests.utils import (
     test_data_ignored,
     test_data_medals,
@@ -54,6 +61,42 @@ def refresh_overview():
     DonorsOverview.refresh_overview()
 
 
+@click.command("refresh-worker")
+@click.option("--batch-size", default=500, help="Donors refreshed at once.")
+@click.option("--interval", default=5.0, help="Seconds between checks of the queue.")
+@click.option("--once", is_flag=True, help="Process the queue once and exit.")
+@with_appcontext
+def refresh_worker(batch_size, interval, once):
+    """Refresh DonorsOverview of donors queued by the web application."""
+    current_app.config["SQLALCHEMY_ECHO"] = False
+    while True:
+        refreshed = OverviewRefreshQueue.process(batch_size=batch_size)
+        if refreshed:
+            print("Refreshed donors:", refreshed)
+        if once:
+            break
+        time.sleep(interval)
+
+
+@click.command("create-snapshots")
+@click.option(
+    "--year",
+    default=lambda: datetime.now().year,
+    type=int,
+    help="Year of the awards, the current one by default.",
+)
+@with_appcontext
+def create_snapshots(year):
+    """Create award eligibility snapshots for all medals which use them."""
+    current_app.config["SQLALCHEMY_ECHO"] = False
+    medals = [medal for medal in Medals.query.all() if medal.use_snapshot()]
+    created, existing = AwardEligibilitySnapshot.create_snapshots(medals, year)
+    for medal, count in created.items():
+        print(f"{medal.title}:", count)
+    for medal, count in existing.items():
+        print(f"{medal.title}:", count, "(snapshot already existed)")
+
+
 @click.command("import-emails")
 @click.argument("csv_file")
 @with_appcontext
@@ -76,7 +119,7 @@ def import_emails(csv_file):
                 email = email.replace(" ", "")
                 email = email.replace(",", ".")
 
-            if not re.match(EMAIL_RE, email):
+            if not EMAIL_PATTERN.match(email):
                 print("Invalid e-mail:", email)
                 counter["invalid emails"] += 1
                 continue
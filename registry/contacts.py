@@ -0,0 +1,136 @@
+"""Detection of contacts and rodna cisla in free text."""
+
+import datetime
+import re
+from typing import NamedTuple
+
+EMAIL_RE = r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"
+# Phone: with country code, or 9 digits starting with 1-9 (not part of longer number)
+PHONE_RE = r"(?:\+420|00420)\s?[1-9]\d{2}\s?\d{3}\s?\d{3}|(?<!\d)[1-9]\d{2}\s?\d{3}\s?\d{3}(?!\d)"
+# RC: slash format or 9-10 digits (valid)
+# This might collide with phone numbers, but it's not a problem because we validate the RC first.
+RC_RE = r"\b\d{6}/\d{3,4}\b|\b\d{9,10}\b"
+
+EMAIL_PATTERN = re.compile(EMAIL_RE)
+PHONE_PATTERN = re.compile(PHONE_RE)
+RC_PATTERN = re.compile(RC_RE)
+# All values are found in a single scan of a text. E-mails go first
+# because they can contain digits, a number which is both a valid RC
+# and a phone number is considered to be RC.
+CONTACTS_PATTERN = re.compile(
+    f"(?P<email>{EMAIL_RE})|(?P<rc>{RC_RE})|(?P<phone>{PHONE_RE})"
+)
+# Notes contain phone numbers of donors but not their rodna cisla
+NOTE_CONTACTS_PATTERN = re.compile(f"(?P<email>{EMAIL_RE})|(?P<phone>{PHONE_RE})")
+NON_DIGITS_PATTERN = re.compile(r"\D")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class Contacts(NamedTuple):
+    rodna_cisla: list
+    emails: list
+    phones: list
+
+
+def find_contacts(text):
+    """Find valid rodna cisla, e-mails and phone numbers in the text.
+
+    Numbers in the format of RC which are not valid are considered to be
+    phone numbers if they match the format of phone numbers.
+    """
+    contacts = Contacts([], [], [])
+    for match in CONTACTS_PATTERN.finditer(text):
+        value = match[0]
+        if match.lastgroup == "email":
+            contacts.emails.append(value)
+        elif match.lastgroup == "phone":
+            contacts.phones.append(value)
+        elif is_valid_rc(value):
+            contacts.rodna_cisla.append(value)
+        elif PHONE_PATTERN.fullmatch(value):
+            contacts.phones.append(value)
+    return contacts
+
+
+def split_note(text):
+    """Split a note to e-mails, phone numbers and the rest of its text.
+
+    Lines of the rest are stripped and empty lines are removed.
+    """
+    emails, phones, other_parts = [], [], []
+    position = 0
+    for match in NOTE_CONTACTS_PATTERN.finditer(text):
+        if match.lastgroup == "email":
+            emails.append(match[0])
+        else:
+            phones.append(match[0])
+        other_parts.append(text[position : match.start()])
+        position = match.end()
+    other_parts.append(text[position:])
+    other_text = "\n".join(
+        line.strip() for line in "".join(other_parts).split("\n") if line.strip()
+    )
+    return emails, phones, other_text
+
+
+def normalize_phone(phone):
+    """Remove whitespace from a phone number."""
+    return WHITESPACE_PATTERN.sub("", phone)
+
+
+def is_valid_rc(value):
+    """
+    Validates Czech birth number (rodné číslo).
+    Supports:
+      - 9 digits (pre-1954, no checksum)
+      - 10 digits (post-1954, checksum mod 11)
+
+    Accepts formats with or without slash.
+    """
+    if not isinstance(value, str):
+        return False
+
+    # remove slash and spaces
+    rc = NON_DIGITS_PATTERN.sub("", value)
+
+    if len(rc) not in (9, 10):
+        return False
+
+    yy = int(rc[0:2])
+    mm = int(rc[2:4])
+    dd = int(rc[4:6])
+
+    # adjust month (women +50)
+    if mm > 50:
+        mm -= 50
+
+    # month validity
+    if not 1 <= mm <= 12:
+        return False
+
+    # year resolution
+    if len(rc) == 9:
+        # pre-1954
+        year = 1900 + yy
+        if year >= 1954:
+            return False
+    else:
+        # 10 digits
+        year = 1900 + yy if yy >= 54 else 2000 + yy
+
+    # date validity
+    try:
+        datetime.date(year, mm, dd)
+    except ValueError:
+        return False
+
+    # checksum for 10-digit RC
+    if len(rc) == 10:
+        num = int(rc[:9])
+        check = num % 11
+        if check == 10:
+            check = 0
+        if check != int(rc[9]):
+            return False
+
+    return True
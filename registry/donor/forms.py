@@ -54,14 +54,16 @@ class AwardMedalForm(FlaskForm):
             flash("Odeslána nevalidní data.", "danger")
             return False
 
-        self.overviews = {}
-        for rodne_cislo in self.rodna_cisla:
-            do = db.session.get(DonorsOverview, rodne_cislo)
-            if do:
-                self.overviews[rodne_cislo] = do
-            else:
-                flash("Odeslána nevalidní data.", "danger")
-                return False
+        rodna_cisla = set(self.rodna_cisla)
+        self.overviews = {
+            do.rodne_cislo: do
+            for do in DonorsOverview.query.filter(
+                DonorsOverview.rodne_cislo.in_(rodna_cisla)
+            )
+        }
+        if len(self.overviews) != len(rodna_cisla):
+            flash("Odeslána nevalidní data.", "danger")
+            return False
 
         return True
 
@@ -1,16 +1,72 @@
-import re
-
-from sqlalchemy import collate
+import json
+import operator
+from datetime import datetime
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy import (
+    bindparam,
+    column,
+    insert,
+    literal,
+    select,
+    table,
+    union_all,
+)
+from sqlalchemy.orm import validates
 from sqlalchemy.sql import text
 
+from registry.contacts import split_note
 from registry.extensions import db
 from registry.list.models import DonationCenter, Medals
-from registry.utils import (
-    EMAIL_RE,
-    capitalize,
-    format_postal_code,
-    split_degrees,
+from registry.utils import capitalize, format_postal_code, split_degrees
+
+# Temporary table with donors whose overview is being refreshed
+refreshed_donors = table("refresh_rodna_cisla", column("rodne_cislo"), schema="temp")
+# Temporary table with candidates for an award eligibility snapshot
+snapshot_candidates = table("snapshot_candidates", column("rodne_cislo"), schema="temp")
+# Temporary table with historical donation counts of the candidates
+snapshot_totals = table(
+    "snapshot_totals", column("rodne_cislo"), column("donation_count"), schema="temp"
+)
+
+# Texts to search in the overview and their FTS5 index with trigram
+# tokenizer which supports LIKE '%...%' queries
+donors_search = table(
+    "donors_search", column("id"), column("rodne_cislo"), column("content")
 )
+donors_search_fts = table("donors_search_fts", column("rowid"), column("content"))
+
+
+def _set_refreshed_donors(rodna_cisla):
+    """Stores rodna cisla of donors being refreshed to a temporary table.
+
+    The table can be joined by queries no matter how many donors are
+    affected. Temporary tables live in the connection so everything
+    using it has to happen in one transaction.
+    """
+    db.session.execute(
+        text(
+            'CREATE TEMP TABLE IF NOT EXISTS "refresh_rodna_cisla" '
+            '("rodne_cislo" VARCHAR(10) PRIMARY KEY)'
+        )
+    )
+    db.session.execute(text('DELETE FROM "temp"."refresh_rodna_cisla"'))
+    db.session.execute(
+        text(
+            'INSERT INTO "temp"."refresh_rodna_cisla" ("rodne_cislo") '
+            "VALUES (:rodne_cislo)"
+        ),
+        [{"rodne_cislo": rc} for rc in rodna_cisla],
+    )
+
+
+def _join_refreshed_donors(table_name):
+    """Returns SQL joining the given table with the donors being refreshed."""
+    return (
+        'JOIN "temp"."refresh_rodna_cisla" '
+        f'ON "refresh_rodna_cisla"."rodne_cislo" = "{table_name}"."rodne_cislo"'
+    )
 
 
 class Batch(db.Model):
@@ -29,7 +85,7 @@ class Record(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     batch_id = db.Column(db.ForeignKey(Batch.id, ondelete="CASCADE"), nullable=False)
     batch = db.relationship("Batch")
-    rodne_cislo = db.Column(db.String(10), index=True, nullable=False)
+    rodne_cislo = db.Column(db.String(10), nullable=False)
     first_name = db.Column(db.String, nullable=False)
     last_name = db.Column(db.String, nullable=False)
     address = db.Column(db.String, nullable=False)
@@ -37,24 +93,166 @@ class Record(db.Model):
     postal_code = db.Column(db.String(5), nullable=False)
     kod_pojistovny = db.Column(db.String(3), nullable=False)
     donation_count = db.Column(db.Integer, nullable=False)
+    # Covers records of a donor searched together with their batches
+    __table_args__ = (
+        db.Index(
+            "ix_records_rodne_cislo_batch_id", rodne_cislo, batch_id, donation_count
+        ),
+    )
 
     def __repr__(self):
         return f"<Record({self.id}) {self.rodne_cislo} from Batch {self.batch}>"
 
+    # Order of values in lines of imported data prefixed by batch id
+    list_columns = (
+        "batch_id",
+        "rodne_cislo",
+        "first_name",
+        "last_name",
+        "address",
+        "city",
+        "postal_code",
+        "kod_pojistovny",
+        "donation_count",
+    )
+
+    @classmethod
+    def values_from_list(cls, list):
+        """Raises ValueError if the number of values doesn't match."""
+        return dict(zip(cls.list_columns, list, strict=True))
+
     @classmethod
     def from_list(cls, list):
-        return cls(
-            batch_id=list[0],
-            rodne_cislo=list[1],
-            first_name=list[2],
-            last_name=list[3],
-            address=list[4],
-            city=list[5],
-            postal_code=list[6],
-            kod_pojistovny=list[7],
-            donation_count=list[8],
+        return cls(**cls.values_from_list(list))
+
+    @classmethod
+    def insert_many(cls, values, chunk_size=1000):
+        """Insert records given as dicts of column values.
+
+        Records are inserted by chunks in executemany statements without
+        creating ORM objects which makes big imports much faster.
+        Returns the number of inserted records.
+        """
+        values = iter(values)
+        inserted = 0
+        while chunk := list(islice(values, chunk_size)):
+            db.session.execute(cls.__table__.insert(), chunk)
+            inserted += len(chunk)
+        return inserted
+
+    @classmethod
+    def donation_counts_as_of_query(cls, dates, rodna_cisla=None):
+        """Select donation counts of donors as they were on the given dates.
+
+        For every date, the last record imported until then is taken from
+        each donation center and their donation counts are summed. Records
+        of the donors are read once to get the interval in which each of
+        them is the latest one of its donation center, from its import
+        until the next import. The dates are then joined to the intervals.
+        Donors without any record imported until a date are missing for it.
+
+        Args:
+            dates: Iterable of datetimes
+            rodna_cisla: Iterable or select of rodna cisla, all donors if None
+
+        Returns:
+            Select with columns "as_of", "rodne_cislo" and "donation_count"
+        """
+        as_of_dates = union_all(
+            *(select(literal(date, db.DateTime).label("as_of")) for date in dates)
+        ).subquery("as_of_dates")
+        # From records imported at the same time, the one with the highest
+        # donation count is the last one so the others get empty intervals.
+        validity = select(
+            cls.rodne_cislo,
+            cls.donation_count,
+            Batch.imported_at.label("valid_from"),
+            db.func.lead(Batch.imported_at)
+            .over(
+                partition_by=(cls.rodne_cislo, Batch.donation_center_id),
+                order_by=(Batch.imported_at, cls.donation_count),
+            )
+            .label("valid_to"),
+        ).join(Batch, Batch.id == cls.batch_id)
+        if rodna_cisla is not None:
+            validity = validity.where(cls.rodne_cislo.in_(rodna_cisla))
+        validity = validity.subquery("validity")
+
+        return (
+            select(
+                as_of_dates.c.as_of,
+                validity.c.rodne_cislo,
+                db.func.sum(validity.c.donation_count).label("donation_count"),
+            )
+            .join(
+                validity,
+                db.and_(
+                    validity.c.valid_from <= as_of_dates.c.as_of,
+                    db.or_(
+                        validity.c.valid_to.is_(None),
+                        as_of_dates.c.as_of < validity.c.valid_to,
+                    ),
+                ),
+            )
+            .group_by(as_of_dates.c.as_of, validity.c.rodne_cislo)
         )
 
+    @classmethod
+    def donation_counts_as_of(cls, dates, rodna_cisla=None):
+        """Get donation counts of donors as they were on the given dates.
+
+        See donation_counts_as_of_query for details.
+
+        Returns:
+            Dictionary {date: {rodne_cislo: donation_count}} with all dates
+        """
+        dates = list(dates)
+        counts = {date: {} for date in dates}
+        if not dates:
+            return counts
+        query = cls.donation_counts_as_of_query(dates, rodna_cisla)
+        for as_of, rodne_cislo, donation_count in db.session.execute(query):
+            counts[as_of][rodne_cislo] = donation_count
+        return counts
+
+
+class LatestRecord(db.Model):
+    """The most recent record of a donor from one donation center.
+
+    Manual imports have no donation center so there is one row with
+    donation_center_id NULL for them. The table is maintained by triggers
+    on the "records" table: inserted records replace older ones with the
+    same key and when a record is deleted, the next most recent record
+    for its key takes its place.
+    """
+
+    __tablename__ = "latest_records"
+    id = db.Column(db.Integer, primary_key=True)
+    rodne_cislo = db.Column(db.String(10), nullable=False)
+    donation_center_id = db.Column(db.ForeignKey(DonationCenter.id))
+    record_id = db.Column(db.ForeignKey(Record.id), nullable=False)
+    record = db.relationship("Record")
+    imported_at = db.Column(db.DateTime, nullable=False)
+    donation_count = db.Column(db.Integer, nullable=False)
+    __table_args__ = (
+        db.Index(
+            "ix_latest_records_rodne_cislo_donation_center_id",
+            rodne_cislo,
+            db.func.ifnull(donation_center_id, 0),
+            unique=True,
+        ),
+        # Covers ranking of the latest records of every donor
+        # so they don't have to be sorted
+        db.Index(
+            "ix_latest_records_rodne_cislo_imported_at",
+            rodne_cislo,
+            imported_at.desc(),
+            donation_count.desc(),
+            donation_center_id,
+            record_id,
+        ),
+    )
+
 
 class IgnoredDonors(db.Model):
     __tablename__ = "ignored_donors"
@@ -65,12 +263,41 @@ class IgnoredDonors(db.Model):
 
 class AwardedMedals(db.Model):
     __tablename__ = "awarded_medals"
-    rodne_cislo = db.Column(db.String(10), index=True, nullable=False)
-    medal_id = db.Column(db.ForeignKey(Medals.id))
+    rodne_cislo = db.Column(db.String(10), nullable=False)
+    medal_id = db.Column(db.ForeignKey(Medals.id), nullable=False)
     medal = db.relationship("Medals")
     # NULL means unknown data - imported from the old system
     awarded_at = db.Column(db.DateTime, nullable=True)
-    __tableargs__ = (db.PrimaryKeyConstraint(rodne_cislo, medal_id),)
+    __table_args__ = (db.PrimaryKeyConstraint(rodne_cislo, medal_id),)
+
+    @classmethod
+    def award(cls, medal, rodna_cisla):
+        """Award the medal to all given donors at once.
+
+        The medal is marked directly in their overview so there is
+        no need to refresh it.
+        """
+        rodna_cisla = set(rodna_cisla)
+        if not rodna_cisla:
+            return
+        awarded_at = datetime.now()
+        db.session.execute(
+            insert(cls),
+            [
+                {
+                    "rodne_cislo": rodne_cislo,
+                    "medal_id": medal.id,
+                    "awarded_at": awarded_at,
+                }
+                for rodne_cislo in rodna_cisla
+            ],
+        )
+        flag_column = "awarded_medal_" + medal.slug
+        if flag_column in DonorsOverview.__table__.c:
+            DonorsOverview.query.filter(
+                DonorsOverview.rodne_cislo.in_(rodna_cisla)
+            ).update({flag_column: True})
+        db.session.commit()
 
 
 class AwardEligibilitySnapshot(db.Model):
@@ -104,118 +331,125 @@ class AwardEligibilitySnapshot(db.Model):
         Returns:
             Number of eligible donors found
         """
-        from datetime import datetime
+        created, existing = cls.create_snapshots([medal], year)
+        return created.get(medal, existing.get(medal))
 
-        from sqlalchemy import and_
+    @classmethod
+    def create_snapshots(cls, medals, year):
+        """Create snapshots of eligible donors for all given medals at once.
+
+        Historical donation counts are calculated only once for candidates
+        of all the medals and the snapshots are written in one transaction.
+        Medals which already have a snapshot for the year are left untouched.
+
+        Args:
+            medals: Iterable of Medals objects
+            year: Year for which awards are being prepared (e.g., 2026)
 
-        # Check if snapshot already exists for this medal/year
-        existing = cls.query.filter_by(medal_id=medal.id, year=year).first()
-        if existing:
-            # Snapshot already created, return count (excluding marker)
-            all_entries = cls.query.filter_by(medal_id=medal.id, year=year).all()
-            return len([e for e in all_entries if e.rodne_cislo != "__EMPTY__"])
+        Returns:
+            Tuple of two dictionaries with number of eligible donors
+            for medals with a created snapshot and for medals
+            with an existing snapshot
+        """
+        counts = {}
+        existing_counts = {}
+        new_medals = []
+        for medal in medals:
+            existing = cls.query.filter_by(medal_id=medal.id, year=year)
+            if existing.first() is not None:
+                # Snapshot already created, return count (excluding marker)
+                existing_counts[medal] = existing.filter(
+                    cls.rodne_cislo != "__EMPTY__"
+                ).count()
+            else:
+                new_medals.append(medal)
+
+        if not new_medals:
+            return counts, existing_counts
 
         # Cutoff date is now (when snapshot is created)
         cutoff_datetime = datetime.now()
-        cutoff_date = cutoff_datetime.strftime("%Y-%m-%d %H:%M:%S")
 
-        # First, get currently eligible donors who haven't been awarded (optimization)
-        currently_eligible = DonorsOverview.query.filter(
-            and_(
-                DonorsOverview.donation_count_total >= medal.minimum_donations,
-                getattr(DonorsOverview, "awarded_medal_" + medal.slug).is_(False),
+        # First, stage donors who are currently eligible for at least one
+        # of the medals and haven't been awarded it yet (optimization)
+        # in a temporary table joined by the query below
+        db.session.execute(
+            text(
+                'CREATE TEMP TABLE IF NOT EXISTS "snapshot_candidates" '
+                '("rodne_cislo" VARCHAR(10) PRIMARY KEY)'
             )
-        ).all()
-
-        candidate_rodne_cisla = [d.rodne_cislo for d in currently_eligible]
-
-        if not candidate_rodne_cisla:
-            # No current candidates - insert marker and return 0
-            marker = cls(
-                medal_id=medal.id,
-                year=year,
-                rodne_cislo="__EMPTY__",
-                created_at=cutoff_datetime,
+        )
+        db.session.execute(text('DELETE FROM "temp"."snapshot_candidates"'))
+        db.session.execute(
+            insert(snapshot_candidates).from_select(
+                ["rodne_cislo"],
+                select(DonorsOverview.rodne_cislo).where(
+                    db.or_(*(cls._currently_eligible(medal) for medal in new_medals))
+                ),
             )
-            db.session.add(marker)
-            db.session.commit()
-            return 0
-
-        # Build IN clause with proper placeholders for SQLite
-        placeholders = ",".join([f":rc_{i}" for i in range(len(candidate_rodne_cisla))])
-
-        # Query to calculate historical donation counts for candidates
-        # Uses the same logic as donors_overview but with date filter
-        query = text(
-            f"""
-            SELECT "rodne_cislo"
-            FROM (
-                SELECT
-                    "outer_records"."rodne_cislo",
-                    (
-                        SELECT SUM("donation_count"."donation_count")
-                        FROM (
-                            SELECT (
-                                SELECT "records"."donation_count"
-                                FROM "records"
-                                    JOIN "batches"
-                                        ON "batches"."id" = "records"."batch_id"
-                                WHERE "records"."rodne_cislo" = "outer_records"."rodne_cislo"
-                                    AND "batches"."imported_at" <= :cutoff_date
-                                    AND (
-                                        "batches"."donation_center_id" = "donation_center_null"."donation_center_id"
-                                        OR (
-                                            "batches"."donation_center_id" IS NULL AND
-                                            "donation_center_null"."donation_center_id" IS NULL
-                                        )
-                                    )
-                                ORDER BY "batches"."imported_at" DESC,
-                                    "records"."donation_count" DESC
-                                LIMIT 1
-                            ) AS "donation_count"
-                            FROM (
-                                SELECT "donation_centers"."id" AS "donation_center_id"
-                                FROM "donation_centers"
-                                UNION
-                                SELECT NULL AS "donation_centers"
-                            ) AS "donation_center_null"
-                            WHERE "donation_count" IS NOT NULL
-                        ) AS "donation_count"
-                    ) AS historical_total
-                FROM (
-                    SELECT DISTINCT "rodne_cislo"
-                    FROM "records"
-                    WHERE "rodne_cislo" IN ({placeholders})
-                ) AS "outer_records"
-            ) AS results
-            WHERE historical_total >= :minimum_donations
-        """
         )
 
-        # Build parameters dict with individual rodne_cislo parameters
-        params = {
-            "cutoff_date": cutoff_date,
-            "minimum_donations": medal.minimum_donations,
-        }
-        for i, rc in enumerate(candidate_rodne_cisla):
-            params[f"rc_{i}"] = rc
-
-        result = db.session.execute(query, params)
-
-        eligible_rodne_cisla = [row[0] for row in result]
-
-        # Store the snapshot
-        for rodne_cislo in eligible_rodne_cisla:
-            snapshot = cls(
-                medal_id=medal.id,
-                year=year,
-                rodne_cislo=rodne_cislo,
-                created_at=cutoff_datetime,
+        # Historical donation counts of candidates are calculated and stored
+        # by one query
+        db.session.execute(
+            text(
+                'CREATE TEMP TABLE IF NOT EXISTS "snapshot_totals" '
+                '("rodne_cislo" VARCHAR(10) PRIMARY KEY, "donation_count" INTEGER)'
             )
-            db.session.add(snapshot)
+        )
+        db.session.execute(text('DELETE FROM "temp"."snapshot_totals"'))
+        totals = Record.donation_counts_as_of_query(
+            [cutoff_datetime], select(snapshot_candidates.c.rodne_cislo)
+        ).subquery()
+        db.session.execute(
+            insert(snapshot_totals).from_select(
+                ["rodne_cislo", "donation_count"],
+                select(totals.c.rodne_cislo, totals.c.donation_count),
+            )
+        )
+
+        # Eligibility for every medal is derived from the same totals
+        for medal in new_medals:
+            counts[medal] = db.session.execute(
+                insert(cls).from_select(
+                    ["medal_id", "year", "rodne_cislo", "created_at"],
+                    select(
+                        literal(medal.id),
+                        literal(year),
+                        snapshot_totals.c.rodne_cislo,
+                        literal(cutoff_datetime, db.DateTime),
+                    )
+                    .join(
+                        DonorsOverview,
+                        DonorsOverview.rodne_cislo == snapshot_totals.c.rodne_cislo,
+                    )
+                    .where(
+                        cls._currently_eligible(medal),
+                        snapshot_totals.c.donation_count >= medal.minimum_donations,
+                    ),
+                )
+            ).rowcount
+
+            if not counts[medal]:
+                # No eligible donors - insert marker so the snapshot exists
+                marker = cls(
+                    medal_id=medal.id,
+                    year=year,
+                    rodne_cislo="__EMPTY__",
+                    created_at=cutoff_datetime,
+                )
+                db.session.add(marker)
 
         db.session.commit()
-        return len(eligible_rodne_cisla)
+        return counts, existing_counts
+
+    @staticmethod
+    def _currently_eligible(medal):
+        """Filter for donors eligible for the medal by current donation counts."""
+        return db.and_(
+            DonorsOverview.donation_count_total >= medal.minimum_donations,
+            getattr(DonorsOverview, "awarded_medal_" + medal.slug).is_(False),
+        )
 
     @classmethod
     def get_eligible_rodne_cisla(cls, medal_id, year):
@@ -264,6 +498,52 @@ class DonorsOverview(db.Model):
         uselist=False,
         primaryjoin="foreign(DonorsOverview.rodne_cislo) == Note.rodne_cislo",
     )
+    # Keys for ordering by the Czech collation, see czech_sort_key
+    first_name_sort_key = db.Column(db.LargeBinary)
+    last_name_sort_key = db.Column(db.LargeBinary)
+    address_sort_key = db.Column(db.LargeBinary)
+    city_sort_key = db.Column(db.LargeBinary)
+    postal_code_sort_key = db.Column(db.LargeBinary)
+    kod_pojistovny_sort_key = db.Column(db.LargeBinary)
+    # Indexes in the same order as the frontend table is ordered,
+    # see get_sort_key_for_column_id
+    __table_args__ = (
+        db.Index(
+            "ix_donors_overview_first_name_sort_key",
+            first_name_sort_key,
+            rodne_cislo,
+        ),
+        db.Index(
+            "ix_donors_overview_last_name_sort_key",
+            last_name_sort_key,
+            rodne_cislo,
+        ),
+        db.Index(
+            "ix_donors_overview_address_sort_key",
+            address_sort_key,
+            rodne_cislo,
+        ),
+        db.Index(
+            "ix_donors_overview_city_sort_key",
+            city_sort_key,
+            rodne_cislo,
+        ),
+        db.Index(
+            "ix_donors_overview_postal_code_sort_key",
+            postal_code_sort_key,
+            rodne_cislo,
+        ),
+        db.Index(
+            "ix_donors_overview_kod_pojistovny_sort_key",
+            kod_pojistovny_sort_key,
+            rodne_cislo,
+        ),
+        db.Index(
+            "ix_donors_overview_donation_count_total",
+            donation_count_total,
+            rodne_cislo,
+        ),
+    )
 
     frontend_column_names = {
         "rodne_cislo": "Rodné číslo",
@@ -290,37 +570,107 @@ class DonorsOverview(db.Model):
 
     @classmethod
     def get_filter_for_search(cls, search_str):
-        conditions_all = []
+        index_conditions = []
+        conditions = []
         for part in search_str.split():
-            conditions_all.append([])
-            for column_name in cls.frontend_column_names.keys():
-                if hasattr(cls, column_name):
-                    if column_name == "note":
-                        column = Note.note
-                    else:
-                        column = getattr(cls, column_name)
-                    contains = getattr(column, "contains")
-                    conditions_all[-1].append(contains(part, autoescape=True))
-        return db.and_(*[db.or_(*conditions) for conditions in conditions_all])
+            if len(part) < 3 or "%" in part or "_" in part:
+                # The trigram index cannot serve patterns shorter than three
+                # characters or with escaped wildcards, they are checked
+                # against the stored content instead.
+                conditions.append(
+                    donors_search.c.content.contains(part, autoescape=True)
+                )
+            else:
+                index_conditions.append(donors_search_fts.c.content.like(f"%{part}%"))
+        matching_donors = select(donors_search.c.rodne_cislo).where(*conditions)
+        if index_conditions:
+            matching_donors = matching_donors.join_from(
+                donors_search_fts,
+                donors_search,
+                donors_search.c.id == donors_search_fts.c.rowid,
+            ).where(*index_conditions)
+        return cls.rodne_cislo.in_(matching_donors)
 
     @classmethod
-    def get_order_by_for_column_id(cls, column_id, direction):
+    def get_sort_key_for_column_id(cls, column_id):
+        """Names of columns which define the order of donors when the frontend
+        table is ordered by the given column. Texts are ordered by their
+        precomputed Czech sort keys and rodné číslo is added so the order
+        is unambiguous and pages can be fetched via keyset pagination.
+
+        Returns None for columns which cannot be used for keyset pagination.
+        """
         column_name = list(cls.frontend_column_names.keys())[column_id]
-        if hasattr(cls, column_name):
-            column = getattr(cls, column_name)
-            column_with_collation = collate(column, "czech")
-            return (getattr(column_with_collation, direction)(),)
+        if column_name == "rodne_cislo":
+            return ["rodne_cislo"]
         elif column_name == "donations":
-            column_name = "donation_count_total"
-            column = getattr(cls, column_name)
-            return (getattr(column, direction)(),)
-        elif column_name == "last_award":
+            return ["donation_count_total", "rodne_cislo"]
+        elif column_name in cls.basic_fields:
+            return [column_name + "_sort_key", "rodne_cislo"]
+
+    @classmethod
+    def get_order_by_for_column_id(cls, column_id, direction):
+        sort_key = cls.get_sort_key_for_column_id(column_id)
+        if sort_key is not None:
+            return [
+                getattr(getattr(cls, column_name), direction)()
+                for column_name in sort_key
+            ]
+        column_name = list(cls.frontend_column_names.keys())[column_id]
+        if column_name == "last_award":
             order_by = []
-            for medal in Medals.query.order_by(Medals.id.asc()).all():
+            for medal in Medals.get_all():
                 column = getattr(cls, "awarded_medal_" + medal.slug)
                 order_by.append(getattr(column, direction)())
             return order_by
 
+    @classmethod
+    def get_filter_for_cursor(cls, column_id, direction, cursor):
+        """Filter for donors following the one the cursor was created for
+        in the order given by the column and direction.
+
+        Raises ValueError if the cursor cannot be used for the order.
+        """
+        sort_key = cls.get_sort_key_for_column_id(column_id)
+        if sort_key is None:
+            raise ValueError("Keyset pagination is not possible for the column")
+        values = json.loads(cursor)
+        if not isinstance(values, list) or len(values) != len(sort_key):
+            raise ValueError("Cursor does not match the order")
+        columns = [getattr(cls, column_name) for column_name in sort_key]
+        # Binary sort keys are sent as hexadecimal strings
+        values = [
+            bytes.fromhex(str(value)) if column.name.endswith("_sort_key") else value
+            for column, value in zip(columns, values)
+        ]
+        if direction == "asc":
+            follows, follows_or_equals = operator.gt, operator.ge
+        else:
+            follows, follows_or_equals = operator.lt, operator.le
+        if len(columns) == 1:
+            return follows(columns[0], values[0])
+        # Written without row values so SQLite can use the index
+        # to find the first donor.
+        column, tie_breaker = columns
+        value, tie_breaker_value = values
+        return db.and_(
+            follows_or_equals(column, value),
+            db.or_(
+                follows(column, value),
+                follows(tie_breaker, tie_breaker_value),
+            ),
+        )
+
+    def get_cursor(self, column_id):
+        """Cursor for the next page when this donor is the last one
+        on the current page, None if keyset pagination is not possible."""
+        sort_key = self.get_sort_key_for_column_id(column_id)
+        if sort_key is not None:
+            values = [getattr(self, column_name) for column_name in sort_key]
+            return json.dumps(
+                [value.hex() if isinstance(value, bytes) else value for value in values]
+            )
+
     def dict_for_frontend(self):
         # All standard attributes
         donor_dict = {}
@@ -330,26 +680,13 @@ class DonorsOverview(db.Model):
             # Note object but we need to get its text which
             # is in Note.note attr. We send it as structured data
             # so the frontend can display different icons for different types.
+            # Contacts are parsed already when the note is saved.
             if donor_dict[name] is not None and name == "note":
                 note_obj = donor_dict[name]
-                emails = note_obj.get_emails_from_note()
-                phones = note_obj.get_phones_from_note()
-
-                # Calculate "other text" by removing emails and phones
-                other_text = note_obj.note
-                for email in emails:
-                    other_text = other_text.replace(email, "")
-                for phone in phones:
-                    other_text = other_text.replace(phone, "")
-                # Clean up whitespace
-                other_text = "\n".join(
-                    line.strip() for line in other_text.split("\n") if line.strip()
-                )
-
                 donor_dict[name] = {
-                    "emails": emails,
-                    "phones": phones,
-                    "other": other_text,
+                    "emails": note_obj.emails,
+                    "phones": note_obj.phones,
+                    "other": note_obj.other_text,
                     "raw": note_obj.note,  # Keep full text for fallback
                 }
             elif donor_dict[name] is not None and name in (
@@ -361,20 +698,21 @@ class DonorsOverview(db.Model):
                 donor_dict[name] = capitalize(donor_dict[name])
 
         # Highest awarded medal
-        for medal in Medals.query.order_by(Medals.id.desc()).all():
+        for medal in reversed(self.get_medals_with_columns()):
             if getattr(self, "awarded_medal_" + medal.slug):
                 donor_dict["last_award"] = medal.title
                 break
             else:
                 donor_dict["last_award"] = "Žádné"
         # Dict with all donations which we use on frontend
-        # to generate tooltip
+        # to generate tooltip. It contains the same donation
+        # centers as the query building the overview.
         donor_dict["donations"] = {
             dc.slug: {
                 "count": getattr(self, "donation_count_" + dc.slug),
                 "name": dc.title,
             }
-            for dc in DonationCenter.query.all()
+            for dc in self.get_donation_centers_with_columns()
         }
         donor_dict["donations"]["manual"] = {
             "count": self.donation_count_manual,
@@ -387,26 +725,184 @@ class DonorsOverview(db.Model):
         return donor_dict
 
     @classmethod
-    def refresh_overview(cls, rodne_cislo=None):
+    def schedule_refresh(cls, rodne_cislo=None, rodna_cisla=None):
+        """Refresh the overview of the given donors after their data changed.
+
+        If ``OVERVIEW_REFRESH_IN_BACKGROUND`` is enabled, donors are only
+        added to the queue processed by the ``flask refresh-worker``
+        command. Otherwise they are refreshed immediately.
+        """
         if rodne_cislo:
-            row = db.session.get(cls, rodne_cislo)
-            if row is not None:
-                db.session.delete(row)
-            record = Record.query.filter(
-                Record.rodne_cislo == rodne_cislo
-            ).first_or_404()
-            # Thanks to the lines above, we know that it's safe to create this small
-            # part of the SQL query manually. Usually it's a bad idea due to possible
-            # SQL injection, but, we know that rodne_cislo is valid and exists in
-            # other parts of this database so it should be fine to use it like this.
-            sql_condition = "records.rodne_cislo = :rodne_cislo AND "
-            params = {"rodne_cislo": record.rodne_cislo}
+            rodna_cisla = {rodne_cislo}
+
+        if current_app.config["OVERVIEW_REFRESH_IN_BACKGROUND"]:
+            OverviewRefreshQueue.enqueue(rodna_cisla)
+        else:
+            cls.refresh_overview(rodna_cisla=rodna_cisla)
+
+    @classmethod
+    def refresh_overview(cls, rodne_cislo=None, rodna_cisla=None):
+        """Recalculate the overview table from records and awarded medals.
+
+        Without arguments, the whole table is rebuilt. If ``rodne_cislo``
+        or an iterable of ``rodna_cisla`` is given, only rows of those
+        donors are rebuilt. Donors without any records left (e.g. after
+        a batch is deleted) are just removed from the overview.
+
+        The SQL used to build the table is selected by the
+        ``OVERVIEW_BUILD_ENGINE`` setting.
+        """
+        engine = current_app.config["OVERVIEW_BUILD_ENGINE"]
+        if engine == "subqueries":
+            get_query = cls._get_overview_query_subqueries
+        elif engine == "window":
+            get_query = cls._get_overview_query_window
+        else:
+            raise ValueError(f"Unknown overview build engine: {engine!r}")
+
+        if rodne_cislo:
+            rodna_cisla = {rodne_cislo}
+
+        if rodna_cisla is not None:
+            rodna_cisla = set(rodna_cisla)
+            if not rodna_cisla:
+                return
+            _set_refreshed_donors(rodna_cisla)
+            db.session.execute(
+                text(
+                    'DELETE FROM "donors_overview" WHERE "rodne_cislo" IN '
+                    '(SELECT "rodne_cislo" FROM "temp"."refresh_rodna_cisla")'
+                )
+            )
         else:
             cls.query.delete()
-            sql_condition = ""
-            params = {}
+
+        db.session.execute(text(get_query(scoped=rodna_cisla is not None)))
+
+        # Code moving degrees from last_name to first_name.
+        # Because only 4 % of donors have a degree, it makes
+        # sense to pre-select them via this query.
+        donors_with_degrees = DonorsOverview.query.filter(
+            db.or_(
+                DonorsOverview.last_name.contains(" "),
+                DonorsOverview.last_name.contains("."),
+                DonorsOverview.last_name.contains(","),
+            )
+        )
+        if rodna_cisla is not None:
+            donors_with_degrees = donors_with_degrees.filter(
+                DonorsOverview.rodne_cislo.in_(select(refreshed_donors.c.rodne_cislo))
+            )
+        # Rows were replaced by the raw SQL above so objects possibly
+        # cached in the session have to be loaded again.
+        donors_with_degrees = donors_with_degrees.execution_options(
+            populate_existing=True
+        ).all()
+
+        for donor in donors_with_degrees:
+            last_name, degrees = split_degrees(donor.last_name)
+            if degrees:
+                donor.first_name = degrees + " " + donor.first_name
+                donor.last_name = last_name
+                db.session.add(donor)
+        db.session.flush()
+
+        cls._refresh_sort_keys(scoped=rodna_cisla is not None)
+        cls._refresh_search_index(scoped=rodna_cisla is not None)
         db.session.commit()
-        full_query = f"""INSERT INTO "donors_overview"
+
+    @classmethod
+    def _refresh_sort_keys(cls, scoped):
+        """Compute keys for ordering texts by the Czech collation.
+
+        The function czech_sort_key is called once per value here instead
+        of comparing the values through Python while sorting.
+        """
+        columns = ",\n".join(
+            f'"{field}_sort_key" = czech_sort_key("{field}")'
+            for field in cls.basic_fields
+            if field != "rodne_cislo"
+        )
+        condition = (
+            'WHERE "rodne_cislo" IN '
+            '(SELECT "rodne_cislo" FROM "temp"."refresh_rodna_cisla")'
+            if scoped
+            else ""
+        )
+        db.session.execute(
+            text(f'UPDATE "donors_overview" SET {columns} {condition}')  # nosec
+        )
+
+    @classmethod
+    def _refresh_search_index(cls, scoped):
+        """Fill the "donors_search" table with texts to search in and update
+        its full-text index "donors_search_fts".
+
+        Searched values are joined by new lines which never are part of
+        a searched word so a match cannot span multiple values. Changes
+        of notes are propagated to the index by triggers on "notes".
+
+        If ``scoped`` is true, only donors from the temporary table
+        "refresh_rodna_cisla" are updated.
+        """
+        content = " || char(10) || ".join(
+            [f'"donors_overview"."{field}"' for field in cls.basic_fields]
+            + ['COALESCE("notes"."note", \'\')']
+        )
+        where = (
+            'WHERE "rodne_cislo" IN '
+            '(SELECT "rodne_cislo" FROM "temp"."refresh_rodna_cisla")'
+            if scoped
+            else ""
+        )
+        overview_join = _join_refreshed_donors("donors_overview") if scoped else ""
+
+        if scoped:
+            # Removing rows from an external content index needs
+            # their original values
+            db.session.execute(
+                text(
+                    f"""INSERT INTO "donors_search_fts"
+    ("donors_search_fts", "rowid", "content")
+SELECT 'delete', "id", "content" FROM "donors_search" {where}"""  # nosec
+                )
+            )
+        db.session.execute(text(f'DELETE FROM "donors_search" {where}'))  # nosec
+        db.session.execute(
+            text(
+                f"""INSERT INTO "donors_search" ("rodne_cislo", "content")
+SELECT "donors_overview"."rodne_cislo", {content}
+FROM "donors_overview"
+    {overview_join}
+    LEFT JOIN "notes"
+        ON "notes"."rodne_cislo" = "donors_overview"."rodne_cislo"
+"""  # nosec
+            )
+        )
+        if scoped:
+            db.session.execute(
+                text(
+                    f"""INSERT INTO "donors_search_fts" ("rowid", "content")
+SELECT "id", "content" FROM "donors_search" {where}"""  # nosec
+                )
+            )
+        else:
+            db.session.execute(
+                text(
+                    'INSERT INTO "donors_search_fts" ("donors_search_fts") '
+                    "VALUES ('rebuild')"
+                )
+            )
+
+    @staticmethod
+    def _get_overview_query_subqueries(scoped):
+        """Build the overview with correlated subqueries for each column.
+
+        If ``scoped`` is true, only donors from the temporary table
+        "refresh_rodna_cisla" are included.
+        """
+        sql_join = _join_refreshed_donors("records") if scoped else ""
+        return f"""INSERT INTO "donors_overview"
     (
         "rodne_cislo",
         "first_name",
@@ -665,9 +1161,10 @@ FROM (
         -- The ultimate core. We need all people, not records or
         -- batches. People are uniquely identified by their
         -- "rodne_cislo".
-        SELECT DISTINCT "rodne_cislo"
+        SELECT DISTINCT "records"."rodne_cislo"
         FROM "records"
-        WHERE {sql_condition} "records"."rodne_cislo" NOT IN (
+        {sql_join}
+        WHERE "records"."rodne_cislo" NOT IN (
             SELECT "rodne_cislo" FROM "ignored_donors"
         )
     ) AS "rodna_cisla"
@@ -678,49 +1175,265 @@ FROM (
         ON "donors_override"."rodne_cislo" = "records"."rodne_cislo";
 """  # nosec
 
-        db.session.execute(text(full_query), params)
-        db.session.commit()
+    @classmethod
+    def get_donation_centers_with_columns(cls):
+        """Donation centers which have their own donation count column."""
+        return [
+            dc
+            for dc in DonationCenter.get_all()
+            if "donation_count_" + dc.slug in cls.__table__.c
+        ]
 
-        # Code moving degrees from last_name to first_name.
-        if rodne_cislo:
-            donors_with_degrees = (db.session.get(DonorsOverview, rodne_cislo),)
-        else:
-            # Because only 4 % of donors have a degree, it makes
-            # sense to pre-select them via this query.
-            donors_with_degrees = DonorsOverview.query.filter(
-                db.or_(
-                    DonorsOverview.last_name.contains(" "),
-                    DonorsOverview.last_name.contains("."),
-                    DonorsOverview.last_name.contains(","),
-                )
-            ).all()
+    @classmethod
+    def get_medals_with_columns(cls):
+        """Medals which have their own awarded medal column."""
+        return [
+            medal
+            for medal in Medals.get_all()
+            if "awarded_medal_" + medal.slug in cls.__table__.c
+        ]
 
-        for donor in donors_with_degrees:
-            last_name, degrees = split_degrees(donor.last_name)
-            if degrees:
-                donor.first_name = degrees + " " + donor.first_name
-                donor.last_name = last_name
-                db.session.add(donor)
+    @classmethod
+    def _get_overview_query_window(cls, scoped):
+        """Build the overview from the table of latest records.
+
+        The most recent records for each combination of donor and donation
+        center are maintained in the "latest_records" table. They are
+        ranked with a window function to find the source of personal data
+        and pivoted to one row per donor with conditional sums. Columns for donation centers
+        and medals are generated from the database so the cost of the
+        query does not grow with their count.
+
+        If ``scoped`` is true, only donors from the temporary table
+        "refresh_rodna_cisla" are included.
+        """
+        latest_records_join = _join_refreshed_donors("latest_records") if scoped else ""
+        awarded_medals_join = _join_refreshed_donors("awarded_medals") if scoped else ""
+        personal_fields = [f for f in cls.basic_fields if f != "rodne_cislo"]
+
+        # Values of IDs are integers from our own tables and column
+        # names are checked against the model so they are safe to be
+        # used directly in the query.
+        donation_counts = {
+            f"donation_count_{dc.slug}": f'"donation_center_id" = {dc.id:d}'
+            for dc in cls.get_donation_centers_with_columns()
+        }
+        donation_counts["donation_count_manual"] = '"donation_center_id" IS NULL'
+        medal_flags = {
+            f"awarded_medal_{medal.slug}": (
+                f'"awarded_medals"."medal_id" = {medal.id:d}'
+            )
+            for medal in cls.get_medals_with_columns()
+        }
+
+        def join_lines(lines, indent):
+            return (",\n" + " " * indent).join(lines)
+
+        columns = join_lines(
+            [f'"{column}"' for column in ["rodne_cislo", *personal_fields]]
+            + [f'"{column}"' for column in donation_counts]
+            + ['"donation_count_total"']
+            + [f'"{column}"' for column in medal_flags],
+            8,
+        )
+        donation_count_sums = join_lines(
+            ['"rodne_cislo"']
+            + [
+                f'SUM(CASE WHEN {condition} THEN "donation_count" ELSE 0 END) '
+                f'AS "{column}"'
+                for column, condition in donation_counts.items()
+            ]
+            + ['SUM("donation_count") AS "donation_count_total"'],
+            8,
+        )
+        medal_flag_maxes = join_lines(
+            ['"awarded_medals"."rodne_cislo"']
+            + [
+                f'MAX({condition}) AS "{column}"'
+                for column, condition in medal_flags.items()
+            ],
+            8,
+        )
+        selected = join_lines(
+            ['"person_records"."rodne_cislo"']
+            + [
+                f'COALESCE("donors_override"."{field}", "records"."{field}")'
+                for field in personal_fields
+            ]
+            + [f'"donation_counts"."{column}"' for column in donation_counts]
+            + ['"donation_counts"."donation_count_total"']
+            + [f'COALESCE("medal_flags"."{column}", 0)' for column in medal_flags],
+            4,
+        )
 
+        return f"""INSERT INTO "donors_overview"
+    (
+        {columns}
+    )
+WITH "person_records" AS (
+    -- There is at most one latest record per person and donation center
+    -- (NULL for manual entries). Ranking them finds the most recent
+    -- record of the person regardless of the donation center which is
+    -- the source of personal data.
+    SELECT
+        "latest_records"."rodne_cislo",
+        "latest_records"."donation_center_id",
+        "latest_records"."donation_count",
+        "latest_records"."record_id",
+        ROW_NUMBER() OVER (
+            PARTITION BY "latest_records"."rodne_cislo"
+            ORDER BY "latest_records"."imported_at" DESC,
+                "latest_records"."donation_count" DESC
+        ) AS "person_rank"
+    FROM "latest_records"
+        {latest_records_join}
+    WHERE "latest_records"."rodne_cislo" NOT IN (
+        SELECT "rodne_cislo" FROM "ignored_donors"
+    )
+),
+"donation_counts" AS (
+    -- Pivots the most recent donation counts to one row per person.
+    -- The grand total sums records from all donation centers.
+    SELECT
+        {donation_count_sums}
+    FROM "person_records"
+    GROUP BY "rodne_cislo"
+),
+"medal_flags" AS (
+    -- Pivots awarded medals to one row per person.
+    SELECT
+        {medal_flag_maxes}
+    FROM "awarded_medals"
+        {awarded_medals_join}
+    GROUP BY "awarded_medals"."rodne_cislo"
+)
+SELECT
+    {selected}
+FROM "person_records"
+    JOIN "records"
+        ON "records"."id" = "person_records"."record_id"
+    JOIN "donation_counts"
+        ON "donation_counts"."rodne_cislo" = "person_records"."rodne_cislo"
+    LEFT JOIN "medal_flags"
+        ON "medal_flags"."rodne_cislo" = "person_records"."rodne_cislo"
+    LEFT JOIN "donors_override"
+        ON "donors_override"."rodne_cislo" = "person_records"."rodne_cislo"
+WHERE "person_records"."person_rank" = 1;
+"""  # nosec
+
+
+class OverviewRefreshQueue(db.Model):
+    """Donors waiting for their overview to be refreshed in the background.
+
+    Every donor is in the queue at most once. When a queued donor changes
+    again, only the time of queueing is updated so the worker knows that
+    the donor has to be refreshed again even if it is processing it at
+    the moment.
+    """
+
+    __tablename__ = "overview_refresh_queue"
+    rodne_cislo = db.Column(db.String(10), primary_key=True)
+    queued_at = db.Column(db.DateTime, nullable=False)
+
+    @classmethod
+    def enqueue(cls, rodna_cisla):
+        rodna_cisla = set(rodna_cisla)
+        if not rodna_cisla:
+            return
+        queued_at = datetime.now()
+        db.session.execute(
+            text(
+                'INSERT INTO "overview_refresh_queue" ("rodne_cislo", "queued_at") '
+                "VALUES (:rodne_cislo, :queued_at) "
+                'ON CONFLICT ("rodne_cislo") '
+                'DO UPDATE SET "queued_at" = "excluded"."queued_at"'
+            ).bindparams(bindparam("queued_at", type_=db.DateTime)),
+            [
+                {"rodne_cislo": rodne_cislo, "queued_at": queued_at}
+                for rodne_cislo in rodna_cisla
+            ],
+        )
         db.session.commit()
 
+    @classmethod
+    def is_pending(cls):
+        return db.session.query(cls.query.exists()).scalar()
+
+    @classmethod
+    def process(cls, batch_size=500):
+        """Refresh the overview of queued donors in batches until
+        the queue is empty. Returns the number of refreshed donors."""
+        refreshed = 0
+        while True:
+            queued = (
+                cls.query.order_by(cls.queued_at)
+                .limit(batch_size)
+                .with_entities(cls.rodne_cislo, cls.queued_at)
+                .all()
+            )
+            if not queued:
+                # Do not keep the read transaction open while waiting
+                db.session.rollback()
+                return refreshed
+
+            DonorsOverview.refresh_overview(
+                rodna_cisla={rodne_cislo for rodne_cislo, _ in queued}
+            )
+            # Donors queued again during the refresh stay in the queue
+            db.session.execute(
+                text(
+                    'DELETE FROM "overview_refresh_queue" '
+                    'WHERE "rodne_cislo" = :rodne_cislo AND "queued_at" = :queued_at'
+                ).bindparams(bindparam("queued_at", type_=db.DateTime)),
+                [
+                    {"rodne_cislo": rodne_cislo, "queued_at": queued_at}
+                    for rodne_cislo, queued_at in queued
+                ],
+            )
+            db.session.commit()
+            refreshed += len(queued)
+
+
+class OverviewStatistics(db.Model):
+    """Values computed from the whole overview. There is only one row
+    which is kept up to date by triggers on the overview table."""
+
+    __tablename__ = "overview_statistics"
+    id = db.Column(db.Integer, primary_key=True)
+    donors_count = db.Column(db.Integer, nullable=False)
+
+    @classmethod
+    def get_donors_count(cls):
+        donors_count = db.session.scalar(select(cls.donors_count))
+        if donors_count is None:
+            donors_count = DonorsOverview.query.count()
+        return donors_count
+
 
 class Note(db.Model):
     __tablename__ = "notes"
     rodne_cislo = db.Column(db.String(10), primary_key=True)
     note = db.Column(db.Text)
+    # Contacts parsed from the note whenever it changes
+    # so they are available without any regex work
+    emails = db.Column(db.JSON, nullable=False, default=list)
+    phones = db.Column(db.JSON, nullable=False, default=list)
+    other_text = db.Column(db.Text, nullable=False, default="")
 
     def __repr__(self):
         return f"<Note for {self.rodne_cislo}: {self.note}>"
 
+    @validates("note")
+    def update_contacts(self, key, note):
+        self.emails, self.phones, self.other_text = split_note(note or "")
+        return note
+
     def get_emails_from_note(self):
-        return re.findall(EMAIL_RE, self.note)
+        return list(self.emails)
 
     def get_phones_from_note(self):
         """Extract all phone numbers from note."""
-        from registry.utils import PHONE_RE
-
-        return re.findall(PHONE_RE, self.note)
+        return list(self.phones)
 
     def get_all_contacts(self):
         """Get structured contact information from note."""
@@ -19,13 +19,15 @@ from flask_login import login_required
 from flask_weasyprint import CSS, HTML
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
-from sqlalchemy import and_, collate, extract
+from sqlalchemy import and_, extract, func, select
+from sqlalchemy.orm import contains_eager
 from werkzeug.wrappers import Response
 
 from registry.extensions import db
 from registry.list.models import DonationCenter, Medals
 from registry.utils import (
     donor_as_row,
+    end_of_year,
     flash_errors,
     get_list_of_images,
     send_email_with_award_doc,
@@ -43,10 +45,12 @@ from .forms import (
 from .models import (
     AwardedMedals,
     AwardEligibilitySnapshot,
+    Batch,
     DonorsOverride,
     DonorsOverview,
     IgnoredDonors,
     Note,
+    OverviewStatistics,
     Record,
 )
 
@@ -85,7 +89,7 @@ def get_eligible_donors_for_medal(medal):
                     getattr(DonorsOverview, "awarded_medal_" + medal.slug).is_(False),
                 )
             )
-            .order_by(collate(DonorsOverview.last_name, "czech"))
+            .order_by(DonorsOverview.last_name_sort_key)
             .all()
         )
     else:
@@ -97,7 +101,7 @@ def get_eligible_donors_for_medal(medal):
                     getattr(DonorsOverview, "awarded_medal_" + medal.slug).is_(False),
                 )
             )
-            .order_by(collate(DonorsOverview.last_name, "czech"))
+            .order_by(DonorsOverview.last_name_sort_key)
             .all()
         )
 
@@ -120,6 +124,46 @@ def awarded():
     )
 
 
+@blueprint.get("/yearly_report/")
+@login_required
+def yearly_report():
+    first_import = db.session.scalar(select(func.min(Batch.imported_at)))
+    if first_import is None:
+        return render_template("donor/yearly_report.html", rows=[])
+    years = range(first_import.year, datetime.now().year + 1)
+    # Donation counts of all donors at the end of every year are
+    # aggregated in the database, ignored donors are left out
+    totals = Record.donation_counts_as_of_query(
+        [end_of_year(year) for year in years],
+        select(DonorsOverview.rodne_cislo),
+    ).subquery()
+    results = {
+        as_of.year: (donors_count, donations_count)
+        for as_of, donors_count, donations_count in db.session.execute(
+            select(
+                totals.c.as_of, func.count(), func.sum(totals.c.donation_count)
+            ).group_by(totals.c.as_of)
+        )
+    }
+
+    rows = []
+    last_donors_count = last_donations_count = 0
+    for year in years:
+        donors_count, donations_count = results.get(year, (0, 0))
+        rows.append(
+            {
+                "year": year,
+                "donors_count": donors_count,
+                "new_donors_count": donors_count - last_donors_count,
+                "donations_count": donations_count,
+                "new_donations_count": donations_count - last_donations_count,
+            }
+        )
+        last_donors_count, last_donations_count = donors_count, donations_count
+
+    return render_template("donor/yearly_report.html", rows=reversed(rows))
+
+
 @blueprint.get("/overview/")
 @login_required
 def overview():
@@ -150,7 +194,9 @@ def overview_data(year=None, medal_slug=None):
         ).all()
         rodna_cisla = [am.rodne_cislo for am in awarded_medals]
         filter_ = DonorsOverview.rodne_cislo.in_(rodna_cisla)
-    all_records_count = DonorsOverview.query.filter(filter_).count()
+        all_records_count = DonorsOverview.query.filter(filter_).count()
+    else:
+        all_records_count = OverviewStatistics.get_donors_count()
 
     # WHERE part
     if params["search[value]"]:
@@ -160,31 +206,46 @@ def overview_data(year=None, medal_slug=None):
         )
 
     # ORDER BY part
-    order_by = DonorsOverview.get_order_by_for_column_id(
-        int(params["order[0][column]"]), params["order[0][dir]"]
-    )
+    column_id = int(params["order[0][column]"])
+    direction = params["order[0][dir]"]
+    order_by = DonorsOverview.get_order_by_for_column_id(column_id, direction)
 
     # LIMIT, OFFSET
     limit = int(params["length"])
     offset = int(params["start"])
 
-    # Final query without limits to see how many records we have after filtering
-    # this number is important for pagination
-    filtered_records_count = (
+    query = (
         DonorsOverview.query.outerjoin(DonorsOverview.note)
+        .options(contains_eager(DonorsOverview.note))
         .filter(filter_)
         .order_by(*order_by)
-        .count()
-    )
-    # Final query
-    overview = (
-        DonorsOverview.query.outerjoin(DonorsOverview.note)
-        .filter(filter_)
-        .order_by(*order_by)
-        .limit(limit)
-        .offset(offset)
-        .all()
     )
+    if params.get("cursor"):
+        # Keyset pagination continues right after the last donor of the previous
+        # page so its cost does not grow with the number of skipped donors.
+        try:
+            cursor_filter = DonorsOverview.get_filter_for_cursor(
+                column_id, direction, params["cursor"]
+            )
+        except ValueError:
+            return abort(400)
+        overview = query.filter(cursor_filter).limit(limit).all()
+        if params["search[value]"]:
+            filtered_records_count = DonorsOverview.query.filter(filter_).count()
+        else:
+            filtered_records_count = all_records_count
+    else:
+        # Final query with the number of records after filtering
+        # which is important for pagination
+        rows = query.add_columns(func.count().over()).limit(limit).offset(offset).all()
+        overview = [donor for donor, _ in rows]
+        if rows:
+            filtered_records_count = rows[0][1]
+        elif offset:
+            # Page after the last one does not tell us the number
+            filtered_records_count = DonorsOverview.query.filter(filter_).count()
+        else:
+            filtered_records_count = 0
 
     # Data processing
     final_list = []
@@ -196,10 +257,22 @@ def overview_data(year=None, medal_slug=None):
             "data": final_list,
             "recordsTotal": all_records_count,
             "recordsFiltered": filtered_records_count,
+            "cursor": overview[-1].get_cursor(column_id) if overview else None,
         }
     )
 
 
+def get_donation_history(rc, records):
+    """Get donation counts of the donor at the end of every year
+    since the first import of their records."""
+    if not records:
+        return []
+    first_year = min(record.batch.imported_at.year for record in records)
+    dates = [end_of_year(year) for year in range(first_year, datetime.now().year + 1)]
+    counts = Record.donation_counts_as_of(dates, [rc])
+    return [(date.year, counts[date].get(rc, 0)) for date in dates]
+
+
 @blueprint.get("/detail/<rc>")
 @login_required
 def detail(rc):
@@ -213,6 +286,7 @@ def detail(rc):
             return redirect(url_for("donor.show_ignored"))
         return abort(404)
     records = Record.query.filter(Record.rodne_cislo == rc).all()
+    donation_history = get_donation_history(rc, records)
     donation_centers = DonationCenter.query.all()
     awarded_medals = AwardedMedals.query.filter(AwardedMedals.rodne_cislo == rc).all()
     awarded_medals = {medal.medal.id: medal for medal in awarded_medals}
@@ -231,6 +305,7 @@ def detail(rc):
         overview=overview,
         donation_centers=donation_centers,
         records=records,
+        donation_history=donation_history,
         awarded_medals=awarded_medals,
         all_medals=all_medals,
         remove_medal_form=remove_medal_form,
@@ -428,7 +503,7 @@ def remove_medal():
     if remove_medal_form.validate_on_submit():
         db.session.delete(remove_medal_form.awarded_medal)
         db.session.commit()
-        DonorsOverview.refresh_overview(rodne_cislo=remove_medal_form.rodne_cislo.data)
+        DonorsOverview.schedule_refresh(rodne_cislo=remove_medal_form.rodne_cislo.data)
         flash("Medaile byla úspěšně odebrána.", "success")
     else:
         flash("Při odebrání medaile došlo k chybě.", "danger")
@@ -621,21 +696,37 @@ def create_snapshot(medal_slug):
     return redirect(url_for("donor.award_prep", medal_slug=medal_slug))
 
 
+@blueprint.post("/create_snapshots")
+@login_required
+def create_snapshots():
+    current_year = datetime.now().year
+    medals = [medal for medal in Medals.query.all() if medal.use_snapshot()]
+    created, existing = AwardEligibilitySnapshot.create_snapshots(medals, current_year)
+    if created:
+        flash(
+            f"Vytvořeny snapshoty pro rok {current_year}: "
+            + ", ".join(f"{medal.title} {count}" for medal, count in created.items())
+            + " oprávněných dárců.",
+            "success",
+        )
+    if existing:
+        flash(
+            f"Snapshoty pro rok {current_year} již existují: "
+            + ", ".join(medal.title for medal in existing)
+            + ".",
+            "warning",
+        )
+
+    return redirect(request.referrer)
+
+
 @blueprint.post("/award_medal")
 @login_required
 def award_medal():
     award_medal_form = AwardMedalForm()
     award_medal_form.rodna_cisla = request.form.getlist("rodne_cislo")
     if award_medal_form.validate_on_submit():
-        for rodne_cislo in award_medal_form.rodna_cisla:
-            am = AwardedMedals(
-                rodne_cislo=rodne_cislo,
-                medal_id=award_medal_form.medal.id,
-                awarded_at=datetime.now(),
-            )
-            db.session.add(am)
-            db.session.commit()
-            DonorsOverview.refresh_overview(rodne_cislo=rodne_cislo)
+        AwardedMedals.award(award_medal_form.medal, award_medal_form.rodna_cisla)
 
         if len(award_medal_form.rodna_cisla) == 1:
             flash("Medaile udělena.", "success")
@@ -702,7 +793,7 @@ def unignore_donor():
     if unignore_form.validate_on_submit():
         db.session.delete(unignore_form.ignored_donor)
         db.session.commit()
-        DonorsOverview.refresh_overview(rodne_cislo=unignore_form.rodne_cislo.data)
+        DonorsOverview.schedule_refresh(rodne_cislo=unignore_form.rodne_cislo.data)
         flash("Dárce již není ignorován.", "success")
     else:
         flash("Při odebírání ze seznamu ignorovaných dárců došlo k chybě", "danger")
@@ -722,7 +813,7 @@ def save_override():
             db.session.merge(override)
             db.session.commit()
 
-            DonorsOverview.refresh_overview()
+            DonorsOverview.schedule_refresh(rodne_cislo=form.rodne_cislo.data)
             flash("Výjimka uložena", "success")
         else:
             # Delete the override
@@ -731,7 +822,7 @@ def save_override():
                 db.session.delete(override)
                 db.session.commit()
 
-                DonorsOverview.refresh_overview()
+                DonorsOverview.schedule_refresh(rodne_cislo=form.rodne_cislo.data)
                 flash("Výjimka smazána", "success")
             else:
                 flash("Není co mazat", "warning")
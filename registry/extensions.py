@@ -4,6 +4,7 @@ in app.py.
 """
 
 import locale
+import sqlite3
 from sqlite3 import Connection as SQLite3Connection
 
 import sqlite_icu
@@ -21,20 +22,81 @@ login_manager = LoginManager()
 db = SQLAlchemy()
 migrate = Migrate()
 
+CZECH_LOCALE = "cs_CZ.utf8"
+
+
+def czech_sort_key(value):
+    """Binary key which orders texts the same way as the "czech" collation.
+
+    The keys are compared byte by byte so SQLite can sort them
+    and use them in indexes without calling Python.
+    """
+    if value is None:
+        return None
+    return locale.strxfrm(value).encode("utf-8", "surrogatepass")
+
+
+def _load_icu_extension(dbapi_connection):
+    dbapi_connection.enable_load_extension(True)
+    dbapi_connection.load_extension(sqlite_icu.extension_path().replace(".so", ""))
+    dbapi_connection.enable_load_extension(False)
+
+
+def init_czech_locale():
+    """Set the Czech locale for the whole process.
+
+    The locale is used by the "czech" collation and czech_sort_key and
+    changing it is not thread-safe, so it is set just once when the app
+    is created. Raises RuntimeError if the locale is not available.
+    """
+    try:
+        locale.setlocale(locale.LC_ALL, CZECH_LOCALE)
+    except locale.Error as e:
+        raise RuntimeError(f"Locale {CZECH_LOCALE} is not available: {e}") from e
+
+
+def check_icu_extension():
+    """Raise RuntimeError if the SQLite ICU extension cannot be loaded
+    so the app does not start instead of failing on the first query."""
+    connection = sqlite3.connect(":memory:")
+    try:
+        _load_icu_extension(connection)
+    except (AttributeError, sqlite3.Error) as e:
+        raise RuntimeError(f"SQLite ICU extension cannot be loaded: {e}") from e
+    finally:
+        connection.close()
+
 
 @event.listens_for(Engine, "connect")
 def _set_sqlite_params(dbapi_connection, connection_record):
     if isinstance(dbapi_connection, SQLite3Connection):
-        # Create collation for proper sorting
-        locale.setlocale(locale.LC_ALL, "cs_CZ.utf8")
+        # Create collation for proper sorting,
+        # the locale is set by init_czech_locale
         dbapi_connection.create_collation("czech", locale.strcoll)
+        dbapi_connection.create_function(
+            "czech_sort_key", 1, czech_sort_key, deterministic=True
+        )
 
         # Load SQLite ICU extension for case-insensitive LIKE
-        dbapi_connection.enable_load_extension(True)
-        dbapi_connection.load_extension(sqlite_icu.extension_path().replace(".so", ""))
-        dbapi_connection.enable_load_extension(False)
+        _load_icu_extension(dbapi_connection)
 
         # Activate foreign keys
         cursor = dbapi_connection.cursor()
         cursor.execute("PRAGMA foreign_keys=ON;")
         cursor.close()
+
+
+def init_sqlite_pragmas(app):
+    """Execute PRAGMA statements from the SQLITE_PRAGMAS setting
+    for every new connection to the SQLite database of the app."""
+    pragmas = app.config.get("SQLITE_PRAGMAS", {})
+
+    def set_pragmas(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, SQLite3Connection):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value};")  # nosec
+            cursor.close()
+
+    with app.app_context():
+        event.listen(db.engine, "connect", set_pragmas)
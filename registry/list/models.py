@@ -1,10 +1,39 @@
 from functools import total_ordering
+from itertools import chain
 
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from sqlalchemy.sql.expression import literal
 
 from registry.extensions import db
 
 
+def _get_reference_data(model):
+    """Returns all rows of the model ordered by id.
+
+    The rows are loaded only once per database transaction because they
+    rarely change and are needed for every donor we display.
+    """
+    reference_data = db.session.info.setdefault("reference_data", {})
+    if model not in reference_data:
+        reference_data[model] = model.query.order_by(model.id).all()
+    return reference_data[model]
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _clear_reference_data(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("reference_data", None)
+
+
+@event.listens_for(Session, "after_flush")
+def _clear_changed_reference_data(session, flush_context):
+    for instance in chain(session.new, session.dirty, session.deleted):
+        if isinstance(instance, (DonationCenter, Medals)):
+            session.info.pop("reference_data", None)
+            break
+
+
 class DonationCenter(db.Model):
     __tablename__ = "donation_centers"
     id = db.Column(db.Integer, primary_key=True)
@@ -14,6 +43,10 @@ class DonationCenter(db.Model):
         db.Boolean, default=False, server_default=literal(False)
     )
 
+    @classmethod
+    def get_all(cls):
+        return _get_reference_data(cls)
+
     def __repr__(self):
         return f"<DonationCenter({self.slug!r})>"
 
@@ -28,6 +61,10 @@ class Medals(db.Model):
     title_acc = db.Column(db.String, nullable=False)
     title_instr = db.Column(db.String, nullable=False)
 
+    @classmethod
+    def get_all(cls):
+        return _get_reference_data(cls)
+
     def use_snapshot(self):
         return self.slug in ("kr3", "kr2", "kr1", "plk")
 
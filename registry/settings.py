@@ -21,8 +21,38 @@ BCRYPT_LOG_ROUNDS = env.int("BCRYPT_LOG_ROUNDS", default=13)
 DEBUG_TB_ENABLED = DEBUG
 DEBUG_TB_INTERCEPT_REDIRECTS = False
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+# Connections are kept open in the pool so the ICU extension and functions
+# registered for every connection are loaded only once per connection.
+# Overflow connections cover peaks and are closed when returned.
+SQLALCHEMY_ENGINE_OPTIONS = {
+    "pool_size": env.int("SQLALCHEMY_POOL_SIZE", default=10),
+    "max_overflow": env.int("SQLALCHEMY_MAX_OVERFLOW", default=10),
+    "pool_timeout": env.int("SQLALCHEMY_POOL_TIMEOUT", default=30),
+}
 PERMANENT_SESSION_LIFETIME = 1800
 SESSION_REFRESH_EACH_REQUEST = True
+# SQL used to build donors overview, "subqueries" or "window"
+OVERVIEW_BUILD_ENGINE = env.str("OVERVIEW_BUILD_ENGINE", default="window")
+# Refresh donors overview by "flask refresh-worker" instead of in requests
+OVERVIEW_REFRESH_IN_BACKGROUND = env.bool(
+    "OVERVIEW_REFRESH_IN_BACKGROUND", default=False
+)
+# Big imports are validated in a pool of processes, 0 or 1 disables the pool
+IMPORT_VALIDATION_PROCESSES = env.int("IMPORT_VALIDATION_PROCESSES", default=0)
+# Number of lines validated by a process at once
+IMPORT_VALIDATION_CHUNK_SIZE = env.int("IMPORT_VALIDATION_CHUNK_SIZE", default=10000)
+# PRAGMA statements executed for every new connection to the SQLite database.
+# In WAL mode, readers are not blocked while the overview is refreshed.
+SQLITE_PRAGMAS = {
+    "journal_mode": env.str("SQLITE_JOURNAL_MODE", default="WAL"),
+    "synchronous": env.str("SQLITE_SYNCHRONOUS", default="NORMAL"),
+    "mmap_size": env.int("SQLITE_MMAP_SIZE", default=256 * 1024 * 1024),
+    # Negative value is in KiB
+    "cache_size": env.int("SQLITE_CACHE_SIZE", default=-64 * 1024),
+    "temp_store": env.str("SQLITE_TEMP_STORE", default="MEMORY"),
+    # Milliseconds to wait for a lock held by another connection
+    "busy_timeout": env.int("SQLITE_BUSY_TIMEOUT", default=5000),
+}
 
 SMTP_SERVER = env.str("SMTP_SERVER")
 SMTP_PORT = env.int("SMTP_PORT")
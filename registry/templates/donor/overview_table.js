@@ -8,6 +8,15 @@ function create_tooltip_for_donations(data) {
 }
 
 var dataTable = null;
+// Cursor returned with the last page, it allows the server to continue
+// right after the last donor when the following page is requested.
+var nextPage = null;
+var requestedPage = null;
+
+function pageKey(params) {
+    var url = dataTable !== null ? dataTable.ajax.url() : null;
+    return JSON.stringify([url, params.order, params.search, params.length]);
+}
 
 $(document).ready( function () {
     const columnDefs = [
@@ -71,7 +80,24 @@ $(document).ready( function () {
         "serverSide": true,
         "stateSave": true,
         "stateDuration": -1, // -1 means session storage in the current browser window
-        "ajax": "{{ url_for('donor.overview_data') }}",
+        "ajax": {
+            "url": "{{ url_for('donor.overview_data') }}",
+            "data": function (params) {
+                if (nextPage !== null && nextPage.start === params.start && nextPage.key === pageKey(params))
+                    params.cursor = nextPage.cursor;
+                requestedPage = params;
+            },
+            "dataSrc": function (json) {
+                nextPage = null;
+                if (json.cursor && requestedPage.length > 0)
+                    nextPage = {
+                        "start": requestedPage.start + requestedPage.length,
+                        "key": pageKey(requestedPage),
+                        "cursor": json.cursor,
+                    };
+                return json.data;
+            },
+        },
         "columns": [
             {% for column_class in column_names.keys() -%}
                 {"data": "{{ column_class }}"},
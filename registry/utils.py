@@ -1,28 +1,28 @@
 """Helper utilities and decorators."""
 
-import datetime
 import os
 import re
 import smtplib
 from contextlib import contextmanager
+from datetime import datetime
 from email.message import EmailMessage
 from glob import glob
 from pathlib import Path
 
-from flask import flash, url_for
+from flask import current_app, flash, url_for
 from markupsafe import Markup
 from wtforms.validators import DataRequired as OriginalDataRequired
 from wtforms.validators import ValidationError
 
+# Patterns are defined together with their compiled versions
+from registry.contacts import (  # noqa: F401
+    EMAIL_RE,
+    PHONE_RE,
+    RC_RE,
+    is_valid_rc,
+)
 from registry.list.models import DonationCenter, Medals
 
-EMAIL_RE = r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"
-# Phone: with country code, or 9 digits starting with 1-9 (not part of longer number)
-PHONE_RE = r"(?:\+420|00420)\s?[1-9]\d{2}\s?\d{3}\s?\d{3}|(?<!\d)[1-9]\d{2}\s?\d{3}\s?\d{3}(?!\d)"
-# RC: slash format or 9-10 digits (valid)
-# This might collide with phone numbers, but it's not a problem because we validate the RC first.
-RC_RE = r"\b\d{6}/\d{3,4}\b|\b\d{9,10}\b"
-
 
 def capitalize(string):
     def get_replacement(match):
@@ -54,9 +54,19 @@ def template_globals():
     """
     Injected into all templates
      - all medals are needed for the nav bar
+     - pending refresh of the overview is shown on every page
+       if the overview is refreshed in background
     """
-    all_medals = Medals.query.all()
-    return dict(all_medals=all_medals)
+    from registry.donor.models import OverviewRefreshQueue
+
+    all_medals = Medals.get_all()
+    return dict(
+        all_medals=all_medals,
+        overview_refresh_pending=(
+            current_app.config["OVERVIEW_REFRESH_IN_BACKGROUND"]
+            and OverviewRefreshQueue.is_pending()
+        ),
+    )
 
 
 @contextmanager
@@ -224,11 +234,18 @@ def date_of_birth_from_rc(rodne_cislo):
     return f"{day}. {month}. {year}"
 
 
+def end_of_year(year):
+    """Returns the last moment of the given year."""
+    return datetime.max.replace(year=year)
+
+
 def donor_as_row(donor):
     """Takes donor and returns line with:
     name;surname;date of birth;address;city;postal_code;kod_pojistovny;donation_centers
     """
-    donation_centers = DonationCenter.query.order_by(DonationCenter.slug.desc()).all()
+    donation_centers = sorted(
+        DonationCenter.get_all(), key=lambda dc: dc.slug, reverse=True
+    )
     dcs_list = []
     for dc in donation_centers:
         if getattr(donor, f"donation_count_{dc.slug}") > 0:
@@ -297,61 +314,3 @@ def get_empty_str_if_none(dictionary, key):
     """Returns empty string if the value for the given key is None"""
     value = dictionary.get(key, "")
     return value if value is not None else ""
-
-
-def is_valid_rc(value):
-    """
-    Validates Czech birth number (rodné číslo).
-    Supports:
-      - 9 digits (pre-1954, no checksum)
-      - 10 digits (post-1954, checksum mod 11)
-
-    Accepts formats with or without slash.
-    """
-    if not isinstance(value, str):
-        return False
-
-    # remove slash and spaces
-    rc = re.sub(r"[^\d]", "", value)
-
-    if len(rc) not in (9, 10):
-        return False
-
-    yy = int(rc[0:2])
-    mm = int(rc[2:4])
-    dd = int(rc[4:6])
-
-    # adjust month (women +50)
-    if mm > 50:
-        mm -= 50
-
-    # month validity
-    if not 1 <= mm <= 12:
-        return False
-
-    # year resolution
-    if len(rc) == 9:
-        # pre-1954
-        year = 1900 + yy
-        if year >= 1954:
-            return False
-    else:
-        # 10 digits
-        year = 1900 + yy if yy >= 54 else 2000 + yy
-
-    # date validity
-    try:
-        datetime.date(year, mm, dd)
-    except ValueError:
-        return False
-
-    # checksum for 10-digit RC
-    if len(rc) == 10:
-        num = int(rc[:9])
-        check = num % 11
-        if check == 10:
-            check = 0
-        if check != int(rc[9]):
-            return False
-
-    return True
@@ -1,6 +1,12 @@
+from contextlib import contextmanager
+from typing import Any, NamedTuple
+
 from flask_wtf import FlaskForm
+from sqlalchemy import event
 from wtforms import StringField
 
+from registry.extensions import db
+
 
 def login(user, testapp):
     res = testapp.post(
@@ -11,3 +17,42 @@ def login(user, testapp):
 
 class FakeForm(FlaskForm):
     field = StringField()
+
+
+class Statement(NamedTuple):
+    statement: str
+    parameters: Any
+    executemany: bool
+
+
+@contextmanager
+def collect_statements(prefix=""):
+    """Collects SQL statements starting with the prefix executed inside
+    the block as a list of Statement tuples."""
+    statements = []
+
+    def collect_statement(conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().startswith(prefix):
+            statements.append(Statement(statement, parameters, many))
+
+    event.listen(db.engine, "before_cursor_execute", collect_statement)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", collect_statement)
+
+
+@contextmanager
+def query_plans(prefix):
+    """Collects plans of queries starting with the prefix executed inside
+    the block as a list of strings with details of their steps."""
+    plans = []
+    with collect_statements(prefix) as statements:
+        yield plans
+
+    connection = db.session.connection()
+    for statement in statements:
+        rows = connection.exec_driver_sql(
+            "EXPLAIN QUERY PLAN " + statement.statement, statement.parameters
+        ).all()
+        plans.append("\n".join(row[3] for row in rows))
@@ -11,6 +11,18 @@ DEBUG_TB_ENABLED = False
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 WTF_CSRF_ENABLED = False  # Allows form testing
 SQLALCHEMY_ECHO = False
+OVERVIEW_BUILD_ENGINE = "window"
+OVERVIEW_REFRESH_IN_BACKGROUND = False
+IMPORT_VALIDATION_PROCESSES = 0
+IMPORT_VALIDATION_CHUNK_SIZE = 10000
+# Test databases are copied as single files so WAL mode is not used
+SQLITE_PRAGMAS = {
+    "journal_mode": "DELETE",
+    "synchronous": "NORMAL",
+    "cache_size": -16 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
 
 EMAIL_SENDER = "foo@example.com"
 SMTP_LOGIN = "foo@example.com"
@@ -14,7 +14,7 @@ from registry.donor.models import (
 from registry.extensions import db
 from registry.list.models import DonationCenter, Medals
 
-from .helpers import login
+from .helpers import collect_statements, login, query_plans
 
 
 class TestAwardEligibilitySnapshot:
@@ -542,3 +542,139 @@ class TestAwardEligibilitySnapshot:
         # Counts should be identical
         assert count1 == count2
         assert snapshot_count1 == snapshot_count2
+
+    def test_snapshot_of_all_donors_with_few_parameters(self, db):
+        """Candidates are not passed to queries as parameters."""
+        medal = Medals.query.filter(Medals.slug == "br").first()
+        current_year = datetime.now().year
+        AwardEligibilitySnapshot.query.filter_by(
+            medal_id=medal.id, year=current_year
+        ).delete()
+        db.session.commit()
+        candidates = DonorsOverview.query.filter(
+            DonorsOverview.donation_count_total >= medal.minimum_donations,
+            DonorsOverview.awarded_medal_br.is_(False),
+        ).count()
+        with collect_statements() as statements:
+            count = AwardEligibilitySnapshot.create_snapshot(medal, current_year)
+
+        # Nobody donated after the cutoff so all candidates are eligible
+        assert count == candidates
+        assert max(len(statement.parameters) for statement in statements) < 10
+
+    def test_create_snapshots_for_all_medals_at_once(self, db):
+        """Snapshots of all medals use donation counts as of their creation."""
+        medals = [medal for medal in Medals.query.all() if medal.use_snapshot()]
+        current_year = datetime.now().year
+        AwardEligibilitySnapshot.query.delete()
+        db.session.commit()
+
+        # Donor reaching the lowest minimum only by a batch imported later
+        minimum = min(medal.minimum_donations for medal in medals)
+        rodne_cislo = "9001010001"
+        dc = DonationCenter.query.first()
+        for imported_at, donation_count in (
+            (datetime.now() - timedelta(days=7), minimum - 1),
+            (datetime.now() + timedelta(days=1), minimum),
+        ):
+            batch = Batch(donation_center_id=dc.id, imported_at=imported_at)
+            db.session.add(batch)
+            db.session.flush()
+            db.session.add(
+                Record(
+                    batch_id=batch.id,
+                    rodne_cislo=rodne_cislo,
+                    first_name="Test",
+                    last_name="Donor",
+                    address="Test St.",
+                    city="Test City",
+                    postal_code="12345",
+                    kod_pojistovny="111",
+                    donation_count=donation_count,
+                )
+            )
+        db.session.commit()
+        DonorsOverview.refresh_overview(rodne_cislo=rodne_cislo)
+
+        # Nobody else has a batch imported after the cutoff so the rest
+        # of donors are eligible by their current donation counts
+        expected = {}
+        for medal in medals:
+            donors = DonorsOverview.query.filter(
+                DonorsOverview.donation_count_total >= medal.minimum_donations,
+                getattr(DonorsOverview, "awarded_medal_" + medal.slug).is_(False),
+                DonorsOverview.rodne_cislo != rodne_cislo,
+            )
+            expected[medal.id] = sorted(donor.rodne_cislo for donor in donors)
+
+        with collect_statements('INSERT INTO "temp".snapshot_totals') as statements:
+            counts, existing = AwardEligibilitySnapshot.create_snapshots(
+                medals, current_year
+            )
+
+        # Historical totals are calculated only once
+        assert len(statements) == 1
+        assert existing == {}
+        for medal in medals:
+            eligible = AwardEligibilitySnapshot.get_eligible_rodne_cisla(
+                medal.id, current_year
+            )
+            assert sorted(eligible) == expected[medal.id]
+            assert counts[medal] == len(eligible)
+
+        # Existing snapshots are kept as they are and reported separately
+        assert AwardEligibilitySnapshot.create_snapshots(medals, current_year) == (
+            {},
+            counts,
+        )
+
+    def test_create_snapshots_via_button(self, user, testapp):
+        """All snapshots are created by one button on the award prep page."""
+        login(user, testapp)
+        AwardEligibilitySnapshot.query.delete()
+        db.session.commit()
+
+        page = testapp.get(url_for("donor.award_prep", medal_slug="kr3"))
+        page = page.forms["createSnapshotsForm"].submit().follow()
+        assert "Vytvořeny snapshoty" in page
+        assert "již existují" not in page
+
+        for medal in Medals.query.all():
+            snapshot_exists = (
+                AwardEligibilitySnapshot.get_eligible_rodne_cisla(
+                    medal.id, datetime.now().year
+                )
+                is not None
+            )
+            assert snapshot_exists == medal.use_snapshot()
+
+    def test_create_snapshots_via_button_twice(self, user, testapp):
+        """Existing snapshots are not reported as created again."""
+        login(user, testapp)
+        AwardEligibilitySnapshot.query.delete()
+        db.session.commit()
+
+        page = testapp.get(url_for("donor.award_prep", medal_slug="kr3"))
+        page.forms["createSnapshotsForm"].submit().follow()
+        page = page.forms["createSnapshotsForm"].submit().follow()
+
+        assert "Vytvořeny snapshoty" not in page
+        assert f"Snapshoty pro rok {datetime.now().year} již existují" in page
+
+    def test_snapshot_query_plans(self, db):
+        medals = [medal for medal in Medals.query.all() if medal.use_snapshot()]
+        current_year = datetime.now().year
+        AwardEligibilitySnapshot.query.delete()
+        db.session.commit()
+
+        with query_plans('INSERT INTO "temp".snapshot_totals') as plans:
+            AwardEligibilitySnapshot.create_snapshots(medals, current_year)
+        (plan,) = plans
+        assert "COVERING INDEX ix_records_rodne_cislo_batch_id (rodne_cislo=?)" in plan
+
+        with query_plans("SELECT award_eligibility_snapshots") as plans:
+            AwardEligibilitySnapshot.get_eligible_rodne_cisla(
+                medals[0].id, current_year
+            )
+        for plan in plans:
+            assert "(medal_id=? AND year=?)" in plan
@@ -3,12 +3,21 @@
 
 See: http://webtest.readthedocs.org/
 """
+import locale
+from pathlib import Path
+from shutil import copy
+from types import SimpleNamespace
+from unittest.mock import patch
+
 import pytest
 from flask import url_for
+from sqlalchemy import select, text
 from sqlalchemy.exc import IntegrityError
 
-from registry.donor.models import Batch, Record
+from registry.app import create_app
+from registry.donor.models import Batch, DonorsOverview, Record
 
+from .fixtures import TEST_DB_PATH
 from .helpers import login
 
 
@@ -180,6 +189,85 @@ class TestDatabase:
             db.session.commit()
         db.session.rollback()
 
+    def test_sqlite_pragmas(self, app, db):
+        pragmas = app.config["SQLITE_PRAGMAS"]
+        for name in ("cache_size", "busy_timeout"):
+            value = db.session.execute(text(f"PRAGMA {name}")).scalar()
+            assert value == pragmas[name]
+        journal_mode = db.session.execute(text("PRAGMA journal_mode")).scalar()
+        assert journal_mode.upper() == pragmas["journal_mode"]
+
+    def test_new_connection_keeps_locale(self, db):
+        db.engine.dispose()
+        with patch("locale.setlocale") as setlocale:
+            db.session.execute(text("SELECT 1"))
+        setlocale.assert_not_called()
+
+    def test_missing_locale(self):
+        error = locale.Error("unsupported locale setting")
+        with patch("locale.setlocale", side_effect=error):
+            with pytest.raises(RuntimeError, match="cs_CZ.utf8"):
+                create_app("tests.settings")
+
+    def test_missing_icu_extension(self):
+        extension_path = "/nonexistent/libSqliteIcu.so"
+        with patch("sqlite_icu.extension_path", return_value=extension_path):
+            with pytest.raises(RuntimeError, match="ICU"):
+                create_app("tests.settings")
+
+    def test_readers_see_overview_during_refresh(self, app, db):
+        """With the database in WAL mode, the overview can be read from
+        another connection while it is refreshed and the reader sees
+        the rows from before the refresh until it is committed."""
+        db_path = Path(app.instance_path) / "wal.sqlite"
+        copy(TEST_DB_PATH, db_path)
+        wal_app = create_app(
+            SimpleNamespace(
+                **{
+                    **app.config,
+                    "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path.resolve()}",
+                    "SQLITE_PRAGMAS": {
+                        **app.config["SQLITE_PRAGMAS"],
+                        "journal_mode": "WAL",
+                    },
+                }
+            )
+        )
+
+        def read_overview():
+            with db.engine.connect() as reader:
+                return set(reader.scalars(select(DonorsOverview.rodne_cislo)))
+
+        with wal_app.app_context():
+            # Make the refresh remove one donor from the overview
+            rodne_cislo = DonorsOverview.query.first().rodne_cislo
+            Record.query.filter(Record.rodne_cislo == rodne_cislo).delete()
+            db.session.commit()
+            before = read_overview()
+
+            reads = []
+            refresh_search_index = DonorsOverview._refresh_search_index
+
+            def read_during_refresh(scoped):
+                # The refresh transaction is still open here
+                reads.append(read_overview())
+                refresh_search_index(scoped=scoped)
+
+            with patch.object(
+                DonorsOverview,
+                "_refresh_search_index",
+                side_effect=read_during_refresh,
+            ):
+                DonorsOverview.refresh_overview()
+            after = read_overview()
+            db.engine.dispose()
+        for path in db_path.parent.glob(db_path.name + "*"):
+            path.unlink()
+
+        assert reads == [before]
+        assert rodne_cislo in before
+        assert after == before - {rodne_cislo}
+
 
 class TestPageRender:
     testcases = [
@@ -2,13 +2,53 @@ from random import choice
 
 import pytest
 from flask import url_for
+from sqlalchemy.sql import text
 
 from registry.donor.models import Batch, Record
 from registry.extensions import db
+from registry.utils import record_as_input_data
 
 from .helpers import login
 
 
+def latest_records_from_records():
+    """Most recent records for each donor and donation center computed
+    from scratch to be compared with the "latest_records" table."""
+    query = text(
+        """
+        SELECT "rodne_cislo", "donation_center_id", "donation_count"
+        FROM (
+            SELECT
+                "records"."rodne_cislo",
+                "batches"."donation_center_id",
+                "records"."donation_count",
+                ROW_NUMBER() OVER (
+                    PARTITION BY "records"."rodne_cislo",
+                        "batches"."donation_center_id"
+                    ORDER BY "batches"."imported_at" DESC,
+                        "records"."donation_count" DESC
+                ) AS "center_rank"
+            FROM "records"
+                JOIN "batches" ON "batches"."id" = "records"."batch_id"
+        )
+        WHERE "center_rank" = 1
+        ORDER BY "rodne_cislo", "donation_center_id"
+        """
+    )
+    return [tuple(row) for row in db.session.execute(query)]
+
+
+def latest_records_from_table():
+    query = text(
+        """
+        SELECT "rodne_cislo", "donation_center_id", "donation_count"
+        FROM "latest_records"
+        ORDER BY "rodne_cislo", "donation_center_id"
+        """
+    )
+    return [tuple(row) for row in db.session.execute(query)]
+
+
 class TestBatch:
     @pytest.mark.parametrize("batch_id", range(1, 11))
     def test_batch_list(self, user, testapp, batch_id):
@@ -77,3 +117,27 @@ class TestBatch:
         ) as f:
             content_to_compare = f.read()
         assert batch_file.text == content_to_compare
+
+    def test_latest_records_after_import_and_delete(self, user, testapp):
+        login(user, testapp)
+        assert latest_records_from_table() == latest_records_from_records()
+
+        # Import a newer record for a donor with older ones
+        record = Record.query.first()
+        batch = db.session.get(Batch, record.batch_id)
+        res = testapp.get(url_for("batch.import_data"))
+        form = res.forms["importForm"]
+        form["donation_center_id"] = batch.donation_center_id or -1
+        form["input_data"] = record_as_input_data(
+            record, donation_count=str(record.donation_count + 1)
+        )
+        form.submit().follow()
+        assert latest_records_from_table() == latest_records_from_records()
+
+        # Delete the new batch and then the original one
+        for batch_id in (Batch.query.order_by(Batch.id.desc()).first().id, batch.id):
+            res = testapp.get(url_for("batch.batch_list"))
+            for form in res.forms.values():
+                if form.fields["batch_id"][0].value == str(batch_id):
+                    form.submit().follow()
+            assert latest_records_from_table() == latest_records_from_records()
@@ -1,18 +1,23 @@
 from registry.commands import (
+    create_snapshots,
     create_user,
     import_emails,
     install_test_data,
     refresh_overview,
+    refresh_worker,
 )
 from registry.donor.models import (
     AwardedMedals,
+    AwardEligibilitySnapshot,
     DonorsOverride,
     DonorsOverview,
     IgnoredDonors,
     Note,
+    OverviewRefreshQueue,
     Record,
 )
 from registry.extensions import db
+from registry.list.models import Medals
 from registry.user.models import User
 
 
@@ -52,6 +57,20 @@ class TestCommands:
         )
         assert unique_do == unique_records
 
+    def test_refresh_worker(self, app):
+        donor = DonorsOverview.query.first()
+        rodne_cislo, total = donor.rodne_cislo, donor.donation_count_total
+        donor.donation_count_total = -1
+        db.session.commit()
+        OverviewRefreshQueue.enqueue([rodne_cislo])
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(refresh_worker, ["--once"])
+        assert result.exit_code == 0
+
+        assert not OverviewRefreshQueue.is_pending()
+        assert db.session.get(DonorsOverview, rodne_cislo).donation_count_total == total
+
     def test_import_emails(self, app):
         runner = app.test_cli_runner()
 
@@ -79,3 +98,29 @@ class TestCommands:
         )
         assert db.session.get(Note, "130811802") is None
         assert db.session.get(Note, "0552277759") is None
+
+    def test_create_snapshots(self, app):
+        runner = app.test_cli_runner()
+
+        result = runner.invoke(create_snapshots, ["--year", "2020"])
+        assert result.exit_code == 0
+
+        for medal in Medals.query.all():
+            eligible = AwardEligibilitySnapshot.get_eligible_rodne_cisla(medal.id, 2020)
+            if medal.use_snapshot():
+                assert f"{medal.title}: {len(eligible)}" in result.output
+            else:
+                assert eligible is None
+
+        # Existing snapshots are reported as such
+        result = runner.invoke(create_snapshots, ["--year", "2020"])
+        assert result.exit_code == 0
+        for medal in Medals.query.all():
+            if medal.use_snapshot():
+                eligible = AwardEligibilitySnapshot.get_eligible_rodne_cisla(
+                    medal.id, 2020
+                )
+                assert (
+                    f"{medal.title}: {len(eligible)} (snapshot already existed)"
+                    in result.output
+                )
@@ -14,12 +14,13 @@ from registry.batch.utils import (
     process_contact_import_line,
     validate_contact_import_data,
 )
-from registry.donor.models import Note
+from registry.contacts import find_contacts, split_note
+from registry.donor.models import DonorsOverview, Note
 from registry.extensions import db
 from registry.utils import EMAIL_RE, PHONE_RE, RC_RE, is_valid_rc
 
 from .fixtures import delete_note_if_exists, new_rc_if_ignored, sample_of_rc
-from .helpers import login
+from .helpers import collect_statements, login
 
 
 class TestRegexPatterns:
@@ -102,6 +103,35 @@ class TestRegexPatterns:
         assert phone_matches[0] == "+420 734000000"
 
 
+class TestFindContacts:
+    """Test single scan search for contacts."""
+
+    @pytest.mark.parametrize(
+        ("text", "expected"),
+        (
+            (
+                "0407156596 jan.novak@seznam.cz +420 734000000",
+                (["0407156596"], ["jan.novak@seznam.cz"], ["+420 734000000"]),
+            ),
+            # Invalid RC in the format of phone number is a phone number
+            ("040715/6596 602123456", (["040715/6596"], [], ["602123456"])),
+            # Digits in e-mails are not phone numbers
+            ("602123456@seznam.cz", ([], ["602123456@seznam.cz"], [])),
+            ("DANIEL 2004-07-15 213 73991", ([], [], [])),
+        ),
+    )
+    def test_find_contacts(self, text, expected):
+        assert find_contacts(text) == expected
+
+    def test_split_note(self):
+        note = "Volat večer\n602 123 456, a@b.cz\n\n  jiný text  "
+        assert split_note(note) == (
+            ["a@b.cz"],
+            ["602 123 456"],
+            "Volat večer\n,\njiný text",
+        )
+
+
 class TestParseContactLine:
     """Test parse_contact_line function."""
 
@@ -278,6 +308,21 @@ multiple@email.cz and@email.cz {rc1}"""
         assert any("chybí e-mail nebo telefon" in errors for line, errors in invalid)
         assert any("více než jeden e-mail" in errors for line, errors in invalid)
 
+    def test_validation_in_processes(self):
+        """Parallel validation gives the same results in the same order."""
+        lines = []
+        for index, rc in enumerate(sample_of_rc(20)):
+            lines.append(f"{rc} user{index}@example.com 602123{index:03}")
+            lines.append(f"{rc}")
+            lines.append(f"user{index}@example.com {rc} more@example.com")
+            lines.append("")
+        text = "\n".join(lines)
+
+        expected = validate_contact_import_data(text)
+        assert validate_contact_import_data(text, processes=2, chunk_size=7) == (
+            expected
+        )
+
     def test_empty_lines_skipped(self):
         """Test that empty lines are silently skipped."""
         rc1, rc2 = sample_of_rc(2)
@@ -427,6 +472,34 @@ class TestContactImportIntegration:
         assert "jan.novak@seznam.cz" in note.note
         assert "602123456" in note.note
 
+    def test_contact_import_query_count(self, user, testapp):
+        """Donors and notes are loaded at once, not for every line."""
+        login(user, testapp)
+        rodna_cisla = [
+            donor.rodne_cislo
+            for donor in DonorsOverview.query.order_by(DonorsOverview.rodne_cislo)
+            if is_valid_rc(donor.rodne_cislo)
+        ][:20]
+
+        def count_selects(rodna_cisla):
+            for rodne_cislo in rodna_cisla:
+                delete_note_if_exists(rodne_cislo)
+            lines = [f"{rc} donor{i}@example.com" for i, rc in enumerate(rodna_cisla)]
+            # Second line for the same donor updates the same new note
+            lines.append(f"{rodna_cisla[0]} other@example.com")
+            res = testapp.get(url_for("batch.import_contacts"))
+            form = res.forms["contactImportForm"]
+            form["input_data"] = "\n".join(lines)
+            with collect_statements("SELECT") as statements:
+                res = form.submit().follow()
+            assert f"Zpracováno: {len(lines)} řádků" in res
+            assert f"Nových poznámek: {len(rodna_cisla)}" in res
+            note = db.session.get(Note, rodna_cisla[0])
+            assert note.note == "donor0@example.com\nother@example.com"
+            return len(statements)
+
+        assert count_selects(rodna_cisla[:1]) == count_selects(rodna_cisla)
+
     @pytest.mark.parametrize("rc", sample_of_rc(2))
     def test_contact_import_duplicate_detection(self, user, testapp, rc):
         """Test that duplicate contacts are not added."""
@@ -616,6 +689,30 @@ class TestNoteModelMethods:
         assert "marie@email.cz" in contacts["emails"]
         assert "+420602123456" in contacts["phones"]
 
+    @pytest.mark.parametrize("rc", sample_of_rc(1))
+    def test_contacts_updated_with_note(self, db, rc):
+        """Test that stored contacts follow changes of the note."""
+        rc = new_rc_if_ignored(rc)
+        delete_note_if_exists(rc)
+
+        db.session.add(Note(rodne_cislo=rc, note="Volat večer 602123456"))
+        db.session.commit()
+        db.session.expire_all()
+
+        note = db.session.get(Note, rc)
+        assert note.emails == []
+        assert note.phones == ["602123456"]
+        assert note.other_text == "Volat večer"
+
+        note.note += "\njan@email.cz"
+        db.session.commit()
+        db.session.expire_all()
+
+        note = db.session.get(Note, rc)
+        assert note.emails == ["jan@email.cz"]
+        assert note.phones == ["602123456"]
+        assert note.other_text == "Volat večer"
+
 
 class TestFileUpload:
     """Test file upload functionality for contact imports."""
@@ -12,6 +12,7 @@ from registry.donor.models import (
     DonorsOverview,
     IgnoredDonors,
     Note,
+    Record,
 )
 from registry.extensions import db
 from registry.list.models import Medals
@@ -21,7 +22,7 @@ from tests.fixtures import (
     sample_of_rc,
 )
 
-from .helpers import login
+from .helpers import collect_statements, login
 
 
 class TestDataTablesBackend:
@@ -344,3 +345,231 @@ class TestDataTablesBackend:
             res = testapp.get(url_for("donor.overview_data"), params=params)
             assert res.status_code == 200
             assert len(res.json["data"]) == count
+
+    @pytest.mark.parametrize(
+        "search",
+        ("nov", "a", "ová 1", "73", "Ing.", "100%", "_", "X Y Z", "ulice 2 brno"),
+    )
+    def test_json_backend_search_like_columns(self, user, testapp, search):
+        # Search via the full-text index gives the same results as
+        # searching with LIKE in all searched columns
+        conditions = []
+        for part in search.split():
+            columns = [Note.note] + [
+                getattr(DonorsOverview, field) for field in DonorsOverview.basic_fields
+            ]
+            conditions.append(
+                db.or_(*[column.contains(part, autoescape=True) for column in columns])
+            )
+        expected = {
+            donor.rodne_cislo
+            for donor in DonorsOverview.query.outerjoin(DonorsOverview.note).filter(
+                *conditions
+            )
+        }
+
+        params = {
+            "draw": "1",
+            "order[0][column]": "0",
+            "order[0][dir]": "asc",
+            "start": "0",
+            "length": "100000",
+            "search[value]": search,
+            "search[regex]": "false",
+        }
+        login(user, testapp)
+        res = testapp.get(url_for("donor.overview_data"), params=params)
+        assert res.status_code == 200
+        assert {donor["rodne_cislo"] for donor in res.json["data"]} == expected
+
+    def test_json_backend_search_after_note_change(self, user, testapp):
+        rodne_cislo = new_rc_if_ignored(next(sample_of_rc(1)))
+        delete_note_if_exists(rodne_cislo)
+        params = {
+            "draw": "1",
+            "order[0][column]": "0",
+            "order[0][dir]": "asc",
+            "start": "0",
+            "length": "10",
+            "search[value]": "QuxQuux",
+            "search[regex]": "false",
+        }
+        login(user, testapp)
+
+        note = Note(rodne_cislo=rodne_cislo, note="FooBar")
+        db.session.add(note)
+        db.session.commit()
+        res = testapp.get(url_for("donor.overview_data"), params=params)
+        assert len(res.json["data"]) == 0
+
+        note.note = "FooBar QuxQuux"
+        db.session.commit()
+        res = testapp.get(url_for("donor.overview_data"), params=params)
+        assert [donor["rodne_cislo"] for donor in res.json["data"]] == [rodne_cislo]
+
+        DonorsOverview.refresh_overview(rodne_cislo=rodne_cislo)
+        res = testapp.get(url_for("donor.overview_data"), params=params)
+        assert [donor["rodne_cislo"] for donor in res.json["data"]] == [rodne_cislo]
+
+        db.session.delete(note)
+        db.session.commit()
+        res = testapp.get(url_for("donor.overview_data"), params=params)
+        assert len(res.json["data"]) == 0
+
+    @pytest.mark.parametrize("column", (0, 7, 8))
+    def test_json_backend_query_count(self, user, testapp, column):
+        login(user, testapp)
+
+        def count_queries(length):
+            params = {
+                "draw": "1",
+                "order[0][column]": str(column),
+                "order[0][dir]": "desc",
+                "start": "0",
+                "length": str(length),
+                "search[value]": "",
+                "search[regex]": "false",
+            }
+            # Reference data are loaded again in a new transaction
+            db.session.commit()
+            with collect_statements() as statements:
+                res = testapp.get(url_for("donor.overview_data"), params=params)
+            assert len(res.json["data"]) == length
+            return len(statements)
+
+        # The number of queries does not depend on the number of donors
+        assert count_queries(100) == count_queries(1)
+        assert count_queries(100) < 10
+
+    @pytest.mark.parametrize(
+        ("search", "start"), (("", 0), ("", 100000), ("nov", 10), ("QuxQuux", 0))
+    )
+    def test_json_backend_records_count(self, user, testapp, search, start):
+        params = {
+            "draw": "1",
+            "order[0][column]": "2",
+            "order[0][dir]": "asc",
+            "start": str(start),
+            "length": "10",
+            "search[value]": search,
+            "search[regex]": "false",
+        }
+        login(user, testapp)
+        res = testapp.get(url_for("donor.overview_data"), params=params)
+        assert res.json["recordsTotal"] == DonorsOverview.query.count()
+        filter_ = True
+        if search:
+            filter_ = DonorsOverview.get_filter_for_search(search)
+        filtered = DonorsOverview.query.filter(filter_).count()
+        assert res.json["recordsFiltered"] == filtered
+        assert len(res.json["data"]) == max(0, min(10, filtered - start))
+
+    def test_json_backend_records_total_after_refresh(self, user, testapp):
+        params = {
+            "draw": "1",
+            "order[0][column]": "0",
+            "order[0][dir]": "asc",
+            "start": "0",
+            "length": "10",
+            "search[value]": "",
+            "search[regex]": "false",
+        }
+        login(user, testapp)
+        res = testapp.get(url_for("donor.overview_data"), params=params)
+        total = res.json["recordsTotal"]
+
+        rodne_cislo = DonorsOverview.query.first().rodne_cislo
+        Record.query.filter(Record.rodne_cislo == rodne_cislo).delete()
+        db.session.commit()
+        DonorsOverview.refresh_overview(rodne_cislo=rodne_cislo)
+
+        res = testapp.get(url_for("donor.overview_data"), params=params)
+        assert res.json["recordsTotal"] == total - 1
+        assert res.json["recordsFiltered"] == total - 1
+
+    def test_json_backend_records_total_after_ignore(self, user, testapp):
+        params = {
+            "draw": "1",
+            "order[0][column]": "0",
+            "order[0][dir]": "asc",
+            "start": "0",
+            "length": "10",
+            "search[value]": "",
+            "search[regex]": "false",
+        }
+        login(user, testapp)
+        res = testapp.get(url_for("donor.overview_data"), params=params)
+        total = res.json["recordsTotal"]
+
+        rodne_cislo = DonorsOverview.query.first().rodne_cislo
+        res = testapp.get(url_for("donor.show_ignored"))
+        form = res.forms["ignoreDonorForm"]
+        form.fields["rodne_cislo"][0].value = rodne_cislo
+        form.fields["reason"][0].value = "foobarbaz"
+        form.submit().follow()
+
+        res = testapp.get(url_for("donor.overview_data"), params=params)
+        assert res.json["recordsTotal"] == total - 1
+        assert res.json["recordsTotal"] == DonorsOverview.query.count()
+
+        res = testapp.get(url_for("donor.show_ignored"))
+        res.forms[f"unignoreDonorForm_{rodne_cislo}"].submit().follow()
+
+        res = testapp.get(url_for("donor.overview_data"), params=params)
+        assert res.json["recordsTotal"] == total
+
+    @pytest.mark.parametrize("column", (0, 2, 5, 7))
+    @pytest.mark.parametrize("direction", ("asc", "desc"))
+    @pytest.mark.parametrize("search", ("", "ová"))
+    def test_json_backend_keyset_pagination(
+        self, user, testapp, column, direction, search
+    ):
+        params = {
+            "draw": "1",
+            "order[0][column]": str(column),
+            "order[0][dir]": direction,
+            "length": "25",
+            "search[value]": search,
+            "search[regex]": "false",
+        }
+        login(user, testapp)
+        res = testapp.get(
+            url_for("donor.overview_data"), params={**params, "start": "0"}
+        )
+        cursor = res.json["cursor"]
+        for start in range(25, 200, 25):
+            if cursor is None:
+                # The previous page was empty
+                break
+            expected = testapp.get(
+                url_for("donor.overview_data"), params={**params, "start": str(start)}
+            )
+            res = testapp.get(
+                url_for("donor.overview_data"),
+                params={**params, "start": str(start), "cursor": cursor},
+            )
+            assert res.json["data"] == expected.json["data"]
+            assert res.json["recordsFiltered"] == expected.json["recordsFiltered"]
+            assert res.json["recordsTotal"] == expected.json["recordsTotal"]
+            assert res.json["cursor"] == expected.json["cursor"]
+            cursor = res.json["cursor"]
+
+    @pytest.mark.parametrize(
+        ("column", "cursor"), ((8, "[true]"), (0, "[1, 2]"), (0, "x"))
+    )
+    def test_json_backend_invalid_cursor(self, user, testapp, column, cursor):
+        params = {
+            "draw": "1",
+            "order[0][column]": str(column),
+            "order[0][dir]": "asc",
+            "start": "10",
+            "length": "10",
+            "search[value]": "",
+            "search[regex]": "false",
+            "cursor": cursor,
+        }
+        login(user, testapp)
+        res = testapp.get(
+            url_for("donor.overview_data"), params=params, expect_errors=True
+        )
+        assert res.status_code == 400
@@ -1,18 +1,25 @@
-from random import randint
+from datetime import datetime
+from random import Random, randint
 
 import pytest
 from flask import url_for
+from sqlalchemy import select
+from sqlalchemy.sql import text
 
 from registry.donor.models import (
+    Batch,
     DonationCenter,
     DonorsOverride,
     DonorsOverview,
     IgnoredDonors,
+    OverviewRefreshQueue,
+    Record,
 )
 from registry.extensions import db
+from registry.utils import record_as_input_data
 
 from .fixtures import new_rc_if_ignored, sample_of_rc
-from .helpers import login
+from .helpers import login, query_plans
 
 
 class TestDonorsOverview:
@@ -65,6 +72,306 @@ class TestDonorsOverview:
                     donor_overview, attr
                 )
 
+    def test_refresh_overview_only_given_donors(self):
+        donors = DonorsOverview.query.limit(3).all()
+        rodna_cisla = [donor.rodne_cislo for donor in donors]
+        totals = {donor.rodne_cislo: donor.donation_count_total for donor in donors}
+
+        # Break the precalculated data for all three donors
+        DonorsOverview.query.filter(DonorsOverview.rodne_cislo.in_(rodna_cisla)).update(
+            {"donation_count_total": -1}
+        )
+        db.session.commit()
+
+        DonorsOverview.refresh_overview(rodna_cisla=set(rodna_cisla[:2]))
+
+        for rodne_cislo in rodna_cisla[:2]:
+            donor = db.session.get(DonorsOverview, rodne_cislo)
+            assert donor.donation_count_total == totals[rodne_cislo]
+        donor = db.session.get(DonorsOverview, rodna_cisla[2])
+        assert donor.donation_count_total == -1
+
+    @pytest.mark.parametrize("scoped", (False, True))
+    def test_refresh_overview_engines_match(self, app, scoped):
+        def overview_rows():
+            query = text('SELECT * FROM "donors_overview" ORDER BY "rodne_cislo"')
+            return [tuple(row) for row in db.session.execute(query)]
+
+        expected = overview_rows()
+        rodna_cisla = [row[0] for row in expected[::10]] if scoped else None
+
+        app.config["OVERVIEW_BUILD_ENGINE"] = "subqueries"
+        try:
+            DonorsOverview.refresh_overview(rodna_cisla=rodna_cisla)
+        finally:
+            app.config["OVERVIEW_BUILD_ENGINE"] = "window"
+
+        assert overview_rows() == expected
+
+    @pytest.mark.parametrize("scoped", (False, True))
+    def test_refresh_overview_query_plans(self, app, scoped):
+        rodna_cisla = [DonorsOverview.query.first().rodne_cislo] if scoped else None
+
+        with query_plans('INSERT INTO "donors_overview"') as plans:
+            DonorsOverview.refresh_overview(rodna_cisla=rodna_cisla)
+        (plan,) = plans
+        # Latest records are ranked directly from the covering index
+        assert "COVERING INDEX ix_latest_records_rodne_cislo_imported_at" in plan
+        assert "ORDER BY" not in plan
+
+        app.config["OVERVIEW_BUILD_ENGINE"] = "subqueries"
+        try:
+            with query_plans('INSERT INTO "donors_overview"') as plans:
+                DonorsOverview.refresh_overview(rodna_cisla=rodna_cisla)
+        finally:
+            app.config["OVERVIEW_BUILD_ENGINE"] = "window"
+        (plan,) = plans
+        # Records of a donor are not loaded from the table
+        records_steps = [line for line in plan.split("\n") if " records " in line]
+        assert records_steps
+        for step in records_steps:
+            assert (
+                "USING COVERING INDEX ix_records_rodne_cislo_batch_id" in step
+                or "INTEGER PRIMARY KEY" in step
+            )
+
+    def test_refresh_overview_donation_center_without_column(self):
+        donation_center = DonationCenter(slug="new_center", title="New center")
+        db.session.add(donation_center)
+        db.session.commit()
+
+        donor = DonorsOverview.query.first()
+        rodne_cislo = donor.rodne_cislo
+        total = donor.donation_count_total
+        batch = Batch(donation_center_id=donation_center.id, imported_at=datetime.now())
+        db.session.add(batch)
+        db.session.commit()
+        record = Record.query.filter(Record.rodne_cislo == rodne_cislo).first()
+        db.session.add(
+            Record.from_list(
+                [batch.id, rodne_cislo]
+                + record_as_input_data(record).strip().split(";")[1:-1]
+                + [5]
+            )
+        )
+        db.session.commit()
+
+        DonorsOverview.refresh_overview(rodne_cislo=rodne_cislo)
+
+        donor = db.session.get(DonorsOverview, rodne_cislo)
+        assert donor.donation_count_total == total + 5
+        assert "new_center" not in donor.dict_for_frontend()["donations"]
+
+    def test_refresh_overview_removes_donors_without_records(self):
+        rodne_cislo = DonorsOverview.query.first().rodne_cislo
+        Record.query.filter(Record.rodne_cislo == rodne_cislo).delete()
+        db.session.commit()
+
+        DonorsOverview.refresh_overview(rodna_cisla={rodne_cislo})
+
+        assert db.session.get(DonorsOverview, rodne_cislo) is None
+
+
+class TestOverviewRefreshQueue:
+    def test_schedule_refresh_in_background(self, app):
+        donors = DonorsOverview.query.limit(3).all()
+        rodna_cisla = [donor.rodne_cislo for donor in donors]
+        totals = {donor.rodne_cislo: donor.donation_count_total for donor in donors}
+        DonorsOverview.query.filter(DonorsOverview.rodne_cislo.in_(rodna_cisla)).update(
+            {"donation_count_total": -1}
+        )
+        db.session.commit()
+
+        app.config["OVERVIEW_REFRESH_IN_BACKGROUND"] = True
+        try:
+            DonorsOverview.schedule_refresh(rodna_cisla=rodna_cisla)
+            DonorsOverview.schedule_refresh(rodne_cislo=rodna_cisla[0])
+        finally:
+            app.config["OVERVIEW_REFRESH_IN_BACKGROUND"] = False
+
+        # Nothing is refreshed and every donor is queued just once
+        assert OverviewRefreshQueue.query.count() == 3
+        for rodne_cislo in rodna_cisla:
+            assert (
+                db.session.get(DonorsOverview, rodne_cislo).donation_count_total == -1
+            )
+
+        assert OverviewRefreshQueue.process(batch_size=2) == 3
+
+        assert not OverviewRefreshQueue.is_pending()
+        for rodne_cislo in rodna_cisla:
+            donor = db.session.get(DonorsOverview, rodne_cislo)
+            assert donor.donation_count_total == totals[rodne_cislo]
+
+    def test_import_new_donor_in_background(self, app, user, testapp):
+        rodne_cislo = "8001010001"
+        login(user, testapp)
+        res = testapp.get(url_for("batch.import_data"))
+        form = res.forms["importForm"]
+        form["input_data"] = f"{rodne_cislo};Jan;Novák;Ulice 1;Město;73801;111;3"
+        form.fields["donation_center_id"][0].select(1)
+
+        app.config["OVERVIEW_REFRESH_IN_BACKGROUND"] = True
+        try:
+            res = form.submit().follow()
+        finally:
+            app.config["OVERVIEW_REFRESH_IN_BACKGROUND"] = False
+
+        # A single donor is refreshed at once so the detail can be shown
+        assert res.status_code == 200
+        assert res.request.path == url_for("donor.detail", rc=rodne_cislo)
+        assert db.session.get(DonorsOverview, rodne_cislo).donation_count_total == 3
+        assert not OverviewRefreshQueue.is_pending()
+
+    def test_refresh_pending_indicator(self, app, user, testapp):
+        login(user, testapp)
+        OverviewRefreshQueue.enqueue([DonorsOverview.query.first().rodne_cislo])
+        # The queue is not checked without refreshing in background
+        res = testapp.get(url_for("donor.overview"))
+        assert "overviewRefreshPending" not in res
+
+        app.config["OVERVIEW_REFRESH_IN_BACKGROUND"] = True
+        try:
+            res = testapp.get(url_for("donor.overview"))
+            assert "Data se přepočítávají" in res
+
+            OverviewRefreshQueue.process()
+            res = testapp.get(url_for("donor.overview"))
+            assert "overviewRefreshPending" not in res
+        finally:
+            app.config["OVERVIEW_REFRESH_IN_BACKGROUND"] = False
+
+
+class TestDonationCountsAsOf:
+    def add_record(self, rodne_cislo, donation_center, imported_at, donation_count):
+        batch = Batch(donation_center=donation_center, imported_at=imported_at)
+        db.session.add(batch)
+        db.session.flush()
+        db.session.add(
+            Record.from_list(
+                [batch.id, rodne_cislo, "Jan", "Novák", "Ulice 1", "Město", "73801"]
+                + ["111", donation_count]
+            )
+        )
+        db.session.commit()
+
+    def add_donor_history(self, rodne_cislo):
+        fm, trinec = DonationCenter.query.limit(2).all()
+        self.add_record(rodne_cislo, fm, datetime(2020, 6, 1), 10)
+        self.add_record(rodne_cislo, trinec, datetime(2021, 3, 1), 3)
+        self.add_record(rodne_cislo, fm, datetime(2021, 6, 1), 15)
+        self.add_record(rodne_cislo, None, datetime(2022, 1, 1), 2)
+        DonorsOverview.refresh_overview(rodne_cislo=rodne_cislo)
+
+    def test_donation_counts_as_of(self):
+        rodne_cislo = "8001010001"
+        self.add_donor_history(rodne_cislo)
+        dates = [
+            datetime(2019, 12, 31),
+            datetime(2020, 6, 1),
+            datetime(2021, 5, 31),
+            datetime(2021, 12, 31),
+            datetime.now(),
+        ]
+
+        counts = Record.donation_counts_as_of(dates, [rodne_cislo])
+
+        assert counts == {
+            dates[0]: {},
+            dates[1]: {rodne_cislo: 10},
+            dates[2]: {rodne_cislo: 13},
+            dates[3]: {rodne_cislo: 18},
+            dates[4]: {rodne_cislo: 20},
+        }
+
+    def test_donation_counts_as_of_many_imports(self):
+        random = Random(42)
+        rodna_cisla = [f"80010{number:05}" for number in range(100)]
+        for donation_center in DonationCenter.query.all() + [None]:
+            for month in range(0, 36, 2):
+                imported_at = datetime(2020 + month // 12, month % 12 + 1, 1)
+                # Some imports have two batches imported at the same time
+                for _ in range(random.choice((1, 1, 2))):
+                    batch = Batch(
+                        donation_center=donation_center, imported_at=imported_at
+                    )
+                    db.session.add(batch)
+                    db.session.flush()
+                    for rodne_cislo in random.sample(rodna_cisla, 30):
+                        db.session.add(
+                            Record.from_list(
+                                [batch.id, rodne_cislo, "Jan", "Novák", "Ulice 1"]
+                                + ["Město", "73801", "111", random.randint(1, 50)]
+                            )
+                        )
+        db.session.commit()
+        dates = [datetime(2019, 12, 31), datetime(2021, 3, 1), datetime.now()]
+        dates += [datetime(year, 6, 15) for year in range(2020, 2023)]
+
+        records = db.session.execute(
+            select(
+                Record.rodne_cislo,
+                Batch.donation_center_id,
+                Batch.imported_at,
+                Record.donation_count,
+            ).join(Batch, Batch.id == Record.batch_id)
+        ).all()
+        expected = {}
+        for as_of in dates:
+            latest = {}
+            for rodne_cislo, donation_center_id, imported_at, count in records:
+                key = (rodne_cislo, donation_center_id)
+                if imported_at <= as_of and (imported_at, count) > latest.get(
+                    key, (imported_at, -1)
+                ):
+                    latest[key] = (imported_at, count)
+            expected[as_of] = {}
+            for (rodne_cislo, _), (_, count) in latest.items():
+                expected[as_of][rodne_cislo] = (
+                    expected[as_of].get(rodne_cislo, 0) + count
+                )
+
+        assert Record.donation_counts_as_of(dates) == expected
+        assert Record.donation_counts_as_of(dates, rodna_cisla) == {
+            as_of: {
+                rodne_cislo: count
+                for rodne_cislo, count in counts.items()
+                if rodne_cislo in rodna_cisla
+            }
+            for as_of, counts in expected.items()
+        }
+
+    def test_donation_counts_as_of_now_match_overview(self):
+        now = datetime.now()
+        counts = Record.donation_counts_as_of([now])[now]
+
+        for donor in DonorsOverview.query.all():
+            assert counts[donor.rodne_cislo] == donor.donation_count_total
+
+    def test_donation_history_in_detail(self, user, testapp):
+        rodne_cislo = "8001010001"
+        self.add_donor_history(rodne_cislo)
+        login(user, testapp)
+
+        page = testapp.get(url_for("donor.detail", rc=rodne_cislo))
+
+        history = page.html.find(id="donationHistory").get_text(" ", strip=True)
+        expected = {2020: 10, 2021: 18}
+        expected.update({year: 20 for year in range(2022, datetime.now().year + 1)})
+        assert history == " ".join(f"{y} {c}" for y, c in expected.items())
+
+    def test_yearly_report(self, user, testapp):
+        login(user, testapp)
+        donors = DonorsOverview.query.all()
+
+        page = testapp.get(url_for("donor.yearly_report"))
+
+        last_row = page.html.find(id="yearlyReport").find("tbody").find("tr")
+        cells = [cell.get_text() for cell in last_row.find_all("td")]
+        assert cells[0] == str(datetime.now().year)
+        assert cells[1] == str(len(donors))
+        assert cells[3] == str(sum(donor.donation_count_total for donor in donors))
+
 
 class TestIgnore:
     @pytest.mark.parametrize("rodne_cislo", sample_of_rc(10))
@@ -1,12 +1,24 @@
+import json
+from datetime import datetime
 from pathlib import Path
+from time import perf_counter
 
 import pytest
 from flask import url_for
-
-from registry.donor.models import Batch, DonorsOverview, Record
+from webtest import Upload
+
+from registry.batch.utils import (
+    iter_import_data,
+    parse_import_line,
+    validate_import_data,
+)
+from registry.donor.models import Batch, DonorsOverview, LatestRecord, Record
 from registry.extensions import db
 
-from .helpers import login
+from .helpers import collect_statements, login
+
+# Results of iter_import_data for lines of test data files with errors
+EXPECTED_VALIDATION = Path("tests/data/import_validation_expected.json")
 
 
 class TestImport:
@@ -81,6 +93,170 @@ class TestImport:
         assert Record.query.count() == existing_records + new_records
         assert Batch.query.count() == existing_batches + 1
 
+    @pytest.mark.parametrize("encoding", ("cp1250", "utf-8"))
+    def test_valid_input_file(self, user, testapp, encoding):
+        input_data = Path("tests/data/valid_import.txt").read_text(encoding="utf-8")
+        new_records = len(input_data.strip().splitlines())
+        existing_records = Record.query.count()
+        existing_batches = Batch.query.count()
+
+        login(user, testapp)
+        res = testapp.get(url_for("batch.import_data"))
+        form = res.forms["importForm"]
+        form["donation_center_id"] = 1
+        form["encoding"] = encoding
+        form["input_file"] = Upload(
+            "import.txt", input_data.replace("\n", "\r\n").encode(encoding)
+        )
+        res = form.submit().follow()
+        assert "Import proběhl úspěšně" in res
+        assert res.status_code == 200
+
+        assert Record.query.count() == existing_records + new_records
+        assert Batch.query.count() == existing_batches + 1
+        batch = Batch.query.order_by(Batch.id.desc()).first()
+        first_line = Record.query.filter(Record.batch_id == batch.id).first()
+        assert first_line.last_name == input_data.split(";")[2]
+        assert first_line.donation_count == int(input_data.splitlines()[0][-2:])
+
+    def test_repairable_input_file(self, user, testapp):
+        input_data = Path("tests/data/repairable_import.txt").read_bytes()
+        existing_records = Record.query.count()
+
+        login(user, testapp)
+        res = testapp.get(url_for("batch.import_data"))
+        form = res.forms["importForm"]
+        form["donation_center_id"] = 1
+        form["encoding"] = "utf-8"
+        form["input_file"] = Upload("import.txt", input_data)
+        res = form.submit()
+        assert res.status_code == 200
+        # Lines with errors are shown the same way as for the text area
+        form = res.forms["importForm"]
+        assert len(form["valid_lines"].value.splitlines()) == 1
+        assert len(form["invalid_lines"].value.splitlines()) == 11
+        assert len(form["invalid_lines_errors"].value.splitlines()) == 11
+        res = form.submit().follow()
+        assert "Import proběhl úspěšně" in res
+        assert Record.query.count() == existing_records + 12
+
+    def test_input_file_wrong_encoding(self, user, testapp):
+        input_data = Path("tests/data/valid_import.txt").read_text(encoding="utf-8")
+        existing_records = Record.query.count()
+
+        login(user, testapp)
+        res = testapp.get(url_for("batch.import_data"))
+        form = res.forms["importForm"]
+        form["donation_center_id"] = 1
+        form["encoding"] = "utf-8"
+        form["input_file"] = Upload("import.txt", input_data.encode("cp1250"))
+        res = form.submit()
+        assert res.status_code == 200
+        assert "Soubor nelze přečíst ve znakové sadě utf-8" in res
+        assert Record.query.count() == existing_records
+
+    def test_iter_import_data_is_lazy(self):
+        def lines():
+            yield "205225295;TOMÁŠ;VESELÁ;HAMERSKÁ 810;VELKÉ HAMRY;31777;985;69\n"
+            yield "0352152680;LUBOMÍR;ŠIMEK;HUSOVA 2;IVANOVICE NA HANÉ;;409;1\n"
+            raise AssertionError("Lines are consumed in advance")
+
+        results = iter_import_data(lines())
+        assert next(results) == (
+            "205225295;TOMÁŠ;VESELÁ;HAMERSKÁ 810;VELKÉ HAMRY;31777;985;69",
+            None,
+        )
+        assert next(results) == (
+            "0352152680;LUBOMÍR;ŠIMEK;HUSOVA 2;IVANOVICE NA HANÉ;00000;409;1",
+            ["chybí PSČ, nahrazeno nulami"],
+        )
+
+    @pytest.mark.parametrize(
+        ("line", "expected"),
+        (
+            ("205225295;A;B;C;D;31777;985;", None),
+            ("205225295;A;B;C;D;31777;985;0", None),
+            ("205225295;A;B;C;D;31777;985;3", ("205225295;A;B;C;D;31777;985;3", None)),
+            (
+                "205225295;A;;B;C;;D;31777;985;3",
+                (
+                    "205225295;A;B;C;D;31777;985;3",
+                    ["řádek obsahoval dvojici středníků"],
+                ),
+            ),
+            (
+                "205225295;A;B;C;D;31777;3",
+                ("205225295;A;B;C;D;31777;3", ["nedostatek polí"]),
+            ),
+            (
+                "205225295;A;B;C;D;31777;985;1;3",
+                ("205225295;A;B;C;D;31777;985;1;3", ["nadbytek polí"]),
+            ),
+            (
+                "20522529x;;B;C;D;;;1+2",
+                (
+                    "20522529x;;B;C;D;00000;000;3",
+                    [
+                        "rodné číslo není číselné",
+                        "chybí jméno",
+                        "chybí PSČ, nahrazeno nulami",
+                        "chybí pojišťovna, nahrazena nulami",
+                        "vstup 1+2 sečten = 3",
+                    ],
+                ),
+            ),
+            (
+                "2052252;A;B;C;D;31777;985;x",
+                (
+                    "2052252;A;B;C;D;31777;985;x",
+                    ["rodné číslo je příliš krátké", "nevalidní počet odběrů"],
+                ),
+            ),
+        ),
+    )
+    def test_parse_import_line(self, line, expected):
+        assert parse_import_line(line) == expected
+
+    def test_validation_in_processes(self):
+        lines = []
+        for name in ("valid_import.txt", "repairable_import.txt", "invalid_rc.txt"):
+            lines += Path("tests/data", name).read_text(encoding="utf-8").splitlines()
+        text = "\n".join(lines * 10)
+
+        expected = validate_import_data(text)
+        assert validate_import_data(text, processes=2, chunk_size=25) == expected
+        # Small inputs are validated without the pool
+        assert validate_import_data(text, processes=2, chunk_size=len(text)) == (
+            expected
+        )
+
+    @pytest.mark.parametrize(
+        "input_file", ("invalid_import.txt", "invalid_rc.txt", "repairable_import.txt")
+    )
+    def test_iter_import_data_expected_results(self, input_file):
+        lines = Path("tests/data", input_file).read_text(encoding="utf-8").splitlines()
+        expected = json.loads(EXPECTED_VALIDATION.read_text(encoding="utf-8"))
+
+        results = [[line, errors] for line, errors in iter_import_data(lines)]
+        assert results == expected[input_file]
+
+    def test_import_validation_benchmark(self, record_property):
+        expected = json.loads(EXPECTED_VALIDATION.read_text(encoding="utf-8"))
+        lines = []
+        expected_results = []
+        for name, results in expected.items():
+            lines += Path("tests/data", name).read_text(encoding="utf-8").splitlines()
+            expected_results += [tuple(result) for result in results]
+        repeat = 50000 // len(lines)
+
+        start = perf_counter()
+        results = list(iter_import_data(lines * repeat))
+        duration = perf_counter() - start
+
+        # Reported in the JUnit XML report (pytest --junit-xml)
+        record_property("lines_per_second", round(len(lines) * repeat / duration))
+        assert results == expected_results * repeat
+
     def test_invalid_input(self, user, testapp):
         """Tests an invalid import the app cannot fix automaticaly"""
         input_data = Path("tests/data/invalid_import.txt").read_text(encoding="utf-8")
@@ -203,6 +379,42 @@ class TestImport:
         db.session.get(DonorsOverview, "205225299").donation_count_total == 70
         db.session.get(DonorsOverview, "1860231599").donation_count_total == 6
 
+    def test_insert_many(self, user, testapp):
+        lines = Path("tests/data/valid_import.txt").read_text(encoding="utf-8")
+        lines = lines.strip().splitlines()
+        existing_records = Record.query.count()
+        batch = Batch(donation_center_id=1, imported_at=datetime.now())
+        db.session.add(batch)
+        db.session.flush()
+        records = [
+            Record.values_from_list([batch.id] + line.split(";")) for line in lines
+        ]
+        with collect_statements("INSERT INTO records") as statements:
+            inserted = Record.insert_many(records, chunk_size=3)
+        db.session.commit()
+
+        assert inserted == len(lines)
+        # One statement per chunk of records
+        assert [
+            len(statement.parameters) if statement.executemany else 1
+            for statement in statements
+        ] == [3] * (len(lines) // 3) + ([len(lines) % 3] if len(lines) % 3 else [])
+        assert Record.query.count() == existing_records + len(lines)
+        # Latest records are maintained by triggers for bulk inserts as well
+        for line in lines:
+            rodne_cislo, *_, donation_count = line.split(";")
+            latest_record = LatestRecord.query.filter_by(
+                rodne_cislo=rodne_cislo, donation_center_id=1
+            ).one()
+            assert latest_record.record.batch_id == batch.id
+            assert latest_record.donation_count == int(donation_count)
+
+    @pytest.mark.parametrize("extra_values", ([], ["111", "5", "foo"]))
+    def test_values_from_list_wrong_length(self, extra_values):
+        values = [1, "0457098862", "Jana", "Nováková", "Ulice 1", "Město", "73801"]
+        with pytest.raises(ValueError):
+            Record.values_from_list(values + extra_values)
+
     def test_zero_donations(self, user, testapp):
         # three lines in the input file end with zero and should
         # be automatically ommited from the import
@@ -4,6 +4,8 @@ from operator import eq, gt, lt, ne
 
 import pytest
 from flask import url_for
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 
 from registry.donor.models import (
     AwardedMedals,
@@ -14,7 +16,7 @@ from registry.donor.models import (
 from registry.extensions import db
 
 from .fixtures import new_rc_if_ignored, sample_of_rc
-from .helpers import login
+from .helpers import collect_statements, login, query_plans
 
 
 class TestMedals:
@@ -153,6 +155,30 @@ class TestMedals:
         assert el_medal_amount == len(re.findall('title="Udělit medaili"', res.text))
         assert unel_medal_amount == len(re.findall("(Nemá nárok)", res.text))
 
+    def test_award_medal_bulk_queries(self, user, testapp):
+        medal = Medals.query.filter(Medals.slug == "br").first()
+        login(user, testapp)
+        page = testapp.get(url_for("donor.award_prep", medal_slug=medal.slug))
+        form = page.forms["awardMedalForm"]
+        rodna_cisla = [field.value for field in form.fields["rodne_cislo"]]
+        assert len(rodna_cisla) > 10
+
+        with collect_statements() as statements:
+            form.submit()
+
+        # The number of queries does not depend on the number of donors
+        assert len(statements) < 10
+        awarded = AwardedMedals.query.filter(
+            AwardedMedals.rodne_cislo.in_(rodna_cisla),
+            AwardedMedals.medal_id == medal.id,
+        )
+        assert awarded.count() == len(rodna_cisla)
+        awarded_do = DonorsOverview.query.filter(
+            DonorsOverview.rodne_cislo.in_(rodna_cisla),
+            DonorsOverview.awarded_medal_br.is_(True),
+        )
+        assert awarded_do.count() == len(rodna_cisla)
+
     def test_award_nonexisting_medal(self, user, testapp):
         awarded = AwardedMedals.query.count()
         login(user, testapp)
@@ -191,6 +217,44 @@ class TestMedals:
         assert "Při odebrání medaile došlo k chybě." in detail
         assert awarded == AwardedMedals.query.count()
 
+    def test_medal_awarded_only_once(self):
+        awarded_medal = AwardedMedals.query.first()
+
+        with pytest.raises(IntegrityError):
+            AwardedMedals.award(awarded_medal.medal, [awarded_medal.rodne_cislo])
+        db.session.rollback()
+
+    def test_medal_flags_use_primary_key(self):
+        # Same lookups as the medal flags of the overview built by subqueries
+        query = text(
+            'SELECT "donors_overview"."rodne_cislo", '
+            + ", ".join(
+                f"""
+                EXISTS(
+                    SELECT 1
+                    FROM "awarded_medals"
+                        JOIN "medals" ON "medals"."id" = "awarded_medals"."medal_id"
+                    WHERE "awarded_medals"."rodne_cislo"
+                            = "donors_overview"."rodne_cislo"
+                        AND "medals"."slug" = '{medal.slug}'
+                )"""
+                for medal in Medals.query.all()
+            )
+            + ' FROM "donors_overview"'
+        )
+
+        with query_plans("SELECT") as plans:
+            db.session.execute(query).all()
+
+        # Every flag is answered by the primary key without reading the table
+        assert (
+            plans[0].count(
+                "COVERING INDEX sqlite_autoindex_awarded_medals_1"
+                " (rodne_cislo=? AND medal_id=?)"
+            )
+            == Medals.query.count()
+        )
+
     @pytest.mark.parametrize(
         ("operator", "medal", "other_medal"),
         (
@@ -1,9 +1,12 @@
+import locale
+from functools import cmp_to_key
+
 import pytest
 from flask import url_for
 from wtforms.validators import ValidationError
 
 from registry.donor.models import DonorsOverview
-from registry.extensions import db
+from registry.extensions import czech_sort_key, db
 from registry.list.models import DonationCenter
 from registry.utils import (
     NumericValidator,
@@ -327,3 +330,37 @@ class TestUnit:
     )
     def test_is_valid_rc_negative(self, rc):
         assert not is_valid_rc(rc)
+
+
+class TestCzechSortKey:
+    def test_czech_sort_key_order(self):
+        words = [
+            "chata",
+            "Čáp",
+            "cukr",
+            "Cyril",
+            "hrad",
+            "CH",
+            "Ábel",
+            "abeceda",
+            "žena",
+            "zebra",
+            "Řeka",
+            "ruka",
+            "Šimon",
+            "sova",
+            "Ing. Novák",
+            "",
+        ]
+        assert sorted(words, key=czech_sort_key) == sorted(
+            words, key=cmp_to_key(locale.strcoll)
+        )
+
+    def test_overview_sort_keys(self):
+        donor = DonorsOverview.query.first()
+        DonorsOverview.refresh_overview(rodne_cislo=donor.rodne_cislo)
+        for donor in DonorsOverview.query.all():
+            for field in DonorsOverview.basic_fields[1:]:
+                assert getattr(donor, field + "_sort_key") == czech_sort_key(
+                    getattr(donor, field)
+                )
@@ -31,6 +31,7 @@ def test_data_records(db, limit=None):
         for item in DonationCenter.query.all():
             donation_centers[item.slug] = item
         batches = {}
+        records = []
         for index, row in tqdm(enumerate(reader), desc="Records"):
             (
                 id,
@@ -66,21 +67,23 @@ def test_data_records(db, limit=None):
                     imported_at=datetime.strptime(import_date, "%Y-%m-%d %H:%M:%S"),
                 )
                 db.session.add(batches[import_date])
-                db.session.commit()
-
-            record = Record(
-                batch_id=batches[import_date].id,
-                rodne_cislo=rodne_cislo,
-                first_name=first_name,
-                last_name=last_name,
-                address=address,
-                city=city,
-                postal_code=postal_code,
-                kod_pojistovny=kod_pojistovny,
-                donation_count=int(float(donation_count)),
+                db.session.flush()
+
+            records.append(
+                {
+                    "batch_id": batches[import_date].id,
+                    "rodne_cislo": rodne_cislo,
+                    "first_name": first_name,
+                    "last_name": last_name,
+                    "address": address,
+                    "city": city,
+                    "postal_code": postal_code,
+                    "kod_pojistovny": kod_pojistovny,
+                    "donation_count": int(float(donation_count)),
+                }
             )
-            db.session.add(record)
 
+    Record.insert_many(records)
     db.session.commit()
 
     records_count = Record.query.count()